@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Benchmark the checks of editable installs built with editable-rebuild.
+
+Measure the stamp check of unchanged sources, done on the first import of a module
+of the editable install, and the overhead of the finder on imports of other modules
+before that.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import cmeel_editable
+
+
+def measure(func, runs: int) -> float:
+    """Get the mean duration of func, in µs."""
+    start = time.perf_counter()
+    for _ in range(runs):
+        func()
+    return (time.perf_counter() - start) * 1e6 / runs
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--runs", type=int, default=1000)
+    parser.add_argument(
+        "-f", "--files", type=int, nargs="+", default=[100, 1000, 10000]
+    )
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="cmeel-bench-") as tmp:
+        build, sitelib = Path(tmp) / "bld", Path(tmp) / "sitelib"
+        build.mkdir()
+        sitelib.mkdir()
+        (sitelib / "edmod.py").touch()
+        for count in args.files:
+            source = Path(tmp) / f"src{count}"
+            for i in range(count):
+                directory = source / f"dir{i // 100}"
+                directory.mkdir(parents=True, exist_ok=True)
+                (directory / f"file{i}.cpp").touch()
+            cmeel_editable.write_stamp(str(source), str(build))
+            assert not cmeel_editable.changed(str(source), str(build))
+            check = measure(
+                lambda src=str(source): cmeel_editable.changed(src, str(build)),
+                args.runs,
+            )
+            print(f"stamp check of {count:>6} files: {check:9.1f} µs")
+
+        finder = cmeel_editable.Finder("edmod", tmp, str(build), str(sitelib))
+        finder.find_spec("os")
+        other = measure(lambda: finder.find_spec("os.path"), args.runs * 100)
+        print(f"finder overhead on other imports: {other * 1000:9.1f} ns")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Benchmark a numeric kernel built for each x86-64 level supported by this CPU.
+
+The kernel is built as for isa-variants, with ``-O3 -march=<level>``, and the
+speedup of each level is given relative to the baseline x86-64 build.
+"""
+
+import argparse
+import os
+import shlex
+import sys
+from pathlib import Path
+from subprocess import check_call, run
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cmeel.isa import BASELINE, LEVELS, best_level, cpu_flags
+
+KERNEL = r"""
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+/* polynomial evaluation: vectorized, with FMA from x86-64-v3 */
+static void poly(int n, const float *x, float *y) {
+  for (int i = 0; i < n; ++i) {
+    float v = x[i], p = 0.5f;
+    for (int k = 0; k < 8; ++k) p = p * v + 0.25f;
+    y[i] = p;
+  }
+}
+
+/* bit counting: POPCNT from x86-64-v2 */
+static uint64_t bits(int n, const uint64_t *x) {
+  uint64_t s = 0;
+  for (int i = 0; i < n; ++i) s += __builtin_popcountll(x[i]);
+  return s;
+}
+
+int main(int argc, char **argv) {
+  int n = atoi(argv[1]), runs = atoi(argv[2]);
+  float *x = malloc(n * sizeof(float)), *y = malloc(n * sizeof(float));
+  uint64_t *b = malloc(n * sizeof(uint64_t)), s = 0;
+  for (int i = 0; i < n; ++i) {
+    x[i] = (float)i / n;
+    b[i] = (uint64_t)i * 0x9E3779B97F4A7C15u;
+  }
+  struct timespec start, end;
+  clock_gettime(CLOCK_MONOTONIC, &start);
+  for (int r = 0; r < runs; ++r) {
+    poly(n, x, y);
+    s += bits(n, b) + (uint64_t)y[r % n];
+  }
+  clock_gettime(CLOCK_MONOTONIC, &end);
+  printf("%f %llu\n", (end.tv_sec - start.tv_sec) * 1e3 +
+                          (end.tv_nsec - start.tv_nsec) / 1e6,
+         (unsigned long long)s);
+  return 0;
+}
+"""
+
+
+def levels() -> list:
+    """List the baseline and the levels this CPU supports."""
+    best = best_level(cpu_flags())
+    ret = [BASELINE]
+    for level in LEVELS:
+        if ret[-1] == best:
+            break
+        ret.append(level)
+    return ret
+
+
+def measure(exe: Path, size: int, runs: int, repeat: int) -> float:
+    """Get the best duration of the kernel over repeated executions, in ms."""
+    cmd = [str(exe), str(size), str(runs)]
+    outputs = [
+        run(cmd, capture_output=True, text=True, check=True) for _ in range(repeat)
+    ]
+    return min(float(output.stdout.split()[0]) for output in outputs)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-s", "--size", type=int, default=1 << 12)
+    parser.add_argument("-n", "--runs", type=int, default=20000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    compiler = shlex.split(os.environ.get("CC", "cc"))
+    with TemporaryDirectory(prefix="cmeel-bench-") as tmp:
+        source = Path(tmp) / "kernel.c"
+        source.write_text(KERNEL)
+        results = {}
+        for level in levels():
+            exe = Path(tmp) / level
+            check_call(
+                [*compiler, "-O3", f"-march={level}", str(source), "-o", str(exe)]
+            )
+            results[level] = measure(exe, args.size, args.runs, args.repeat)
+        for level, result in results.items():
+            speedup = results[BASELINE] / result
+            print(f"{level:>9}: {result:8.2f} ms, speedup {speedup:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
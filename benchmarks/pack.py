@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Benchmark cmeel wheel packing against a sequential zipfile packing.
+
+A synthetic install tree is generated, with many small headers and a few larger
+pseudo shared libraries, then packed by both implementations. The zipfile one
+does what 'python -m wheel pack' did: hash each file, then compress it in the
+archive, one after the other.
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import os
+import random
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from cmeel.pack import pack
+
+DISTRIBUTION = "cmeel_bench-1.0.0"
+TAG = "py3-none-any"
+
+
+def synthetic_tree(wheel_dir: Path, files: int, big: int, big_size: int):
+    """Generate a wheel directory with files headers and big libraries."""
+    rng = random.Random(0)
+    include = wheel_dir / "cmeel.prefix" / "include" / "bench"
+    for i in range(files):
+        header = include / f"dir{i % 100:02d}" / f"header_{i:05d}.hpp"
+        header.parent.mkdir(parents=True, exist_ok=True)
+        words = " ".join(
+            rng.choice(["int", "auto", "template", "struct"]) for _ in range(200)
+        )
+        header.write_text(f"#pragma once\n// {words}\n")
+    lib = wheel_dir / "cmeel.prefix" / "lib"
+    lib.mkdir(parents=True, exist_ok=True)
+    for i in range(big):
+        # half random, half repetitive, to mimic compressible binaries
+        data = os.urandom(big_size // 2) + bytes(big_size // 2)
+        (lib / f"libbench{i}.so").write_bytes(data)
+    dist_info = wheel_dir / f"{DISTRIBUTION}.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text(
+        "Metadata-Version: 2.4\nName: cmeel-bench\nVersion: 1.0.0\n",
+    )
+    (dist_info / "WHEEL").write_text(
+        f"Wheel-Version: 1.0\nRoot-Is-Purelib: false\nBuild: 0\nTag: {TAG}\n",
+    )
+
+
+def zipfile_pack(wheel_dir: Path, dest: Path):
+    """Pack wheel_dir sequentially with zipfile, with a RECORD of the files."""
+    records = []
+    record = f"{DISTRIBUTION}.dist-info/RECORD"
+    with ZipFile(dest / f"{DISTRIBUTION}-0-{TAG}.whl", "w", ZIP_DEFLATED) as zf:
+        for path in sorted(p for p in wheel_dir.rglob("*") if p.is_file()):
+            arcname = path.relative_to(wheel_dir).as_posix()
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            records.append((arcname, f"sha256={digest}", path.stat().st_size))
+            zf.write(path, arcname)
+        with io.StringIO() as f:
+            csv.writer(f).writerows([*records, (record, "", "")])
+            zf.writestr(record, f.getvalue())
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--big", type=int, default=4)
+    parser.add_argument("--big-size", type=int, default=64 << 20)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="cmeel-bench-") as tmp:
+        wheel_dir = Path(tmp) / "whl"
+        synthetic_tree(wheel_dir, args.files, args.big, args.big_size)
+        results = {}
+        for name in ["zipfile", "cmeel"]:
+            dest = Path(tmp) / name
+            dest.mkdir()
+            start = time.perf_counter()
+            if name == "zipfile":
+                zipfile_pack(wheel_dir, dest)
+            else:
+                pack(wheel_dir, dest, DISTRIBUTION, TAG, 0, args.jobs)
+            results[name] = time.perf_counter() - start
+            (whl,) = dest.glob("*.whl")
+            with ZipFile(whl) as zf:
+                assert zf.testzip() is None
+                count = len(zf.namelist())
+            print(f"{name:>7}: {results[name]:7.2f}s, {count} members, {whl.name}")
+        print(f"speedup: {results['zipfile'] / results['cmeel']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Benchmark the latency of executables exposed by cmeel wheels.
+
+Compare a direct call of an executable, the previous wrapper which waited for a
+subprocess, and the current one which replaces the python process with execv.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+import cmeel
+from cmeel.consts import CMEEL_PREFIX
+from cmeel.utils import wrapper
+
+LEGACY = [
+    "import os, sys",
+    "from pathlib import Path",
+    "from subprocess import run",
+    "import cmeel",
+    f"prefix = Path(cmeel.__file__).parent.parent / {CMEEL_PREFIX!r}",
+    "sys.argv[0] = prefix / 'bin' / Path(sys.argv[0]).name",
+    "os.environ['LD_LIBRARY_PATH'] = f'{prefix}/lib'",
+    "exe = run(sys.argv, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)",
+    "sys.exit(exe.returncode)",
+]
+
+
+def write_script(path: Path, content):
+    """Write an executable python script."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join([f"#!{sys.executable}", *content[1:]]))
+    path.chmod(0o755)
+
+
+def measure(cmd, env, runs: int) -> float:
+    """Get the mean duration of a command, in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(runs):
+        run(cmd, env=env, check=True)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--runs", type=int, default=100)
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="cmeel-bench-") as tmp:
+        site = Path(tmp) / "site"
+        site.mkdir()
+        (site / "cmeel").symlink_to(Path(cmeel.__file__).parent)
+        exe = site / CMEEL_PREFIX / "bin" / "hello"
+        exe.parent.mkdir(parents=True)
+        shutil.copy(shutil.which("true") or "/bin/true", exe)
+        write_script(Path(tmp) / "legacy" / "hello", ["", *LEGACY])
+        write_script(Path(tmp) / "exec" / "hello", wrapper(exe))
+
+        env = {**os.environ, "PYTHONPATH": str(site)}
+        for name in ["direct", "legacy", "exec"]:
+            cmd = str(exe) if name == "direct" else str(Path(tmp) / name / "hello")
+            print(f"{name:>6}: {measure([cmd], env, args.runs):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
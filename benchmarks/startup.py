@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Benchmark interpreter startup with and without cmeel.pth.
+
+The site directory of cmeel.pth is processed by site.addsitedir, like for an
+installed cmeel, and PYTHONPATH can be filled with more directories to mimic
+large environments.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).parent.parent
+
+
+def measure(site: Path, env, runs: int) -> float:
+    """Get the mean startup duration of an interpreter using site, in ms."""
+    cmd = [sys.executable, "-c", f"import site; site.addsitedir({str(site)!r})"]
+    start = time.perf_counter()
+    for _ in range(runs):
+        run(cmd, env=env, check=True)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--runs", type=int, default=100)
+    parser.add_argument("-p", "--paths", type=int, default=50)
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="cmeel-bench-") as tmp:
+        without, with_cmeel = Path(tmp) / "without", Path(tmp) / "with"
+        without.mkdir()
+        with_cmeel.mkdir()
+        for name in ["cmeel.pth", "cmeel_pth.py"]:
+            shutil.copy(ROOT / name, with_cmeel)
+        paths = [Path(tmp) / f"path{i}" for i in range(args.paths)]
+        for path in paths:
+            path.mkdir()
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(str(p) for p in paths)}
+
+        results = {
+            site.name: measure(site, env, args.runs) for site in [without, with_cmeel]
+        }
+        for name, result in results.items():
+            print(f"{name:>7} cmeel: {result:7.2f} ms")
+        print(f"overhead: {results['with'] - results['without']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
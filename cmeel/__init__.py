@@ -1,6 +1,47 @@
-"""Cmeel module."""
+"""Cmeel module.
 
-# ruff: noqa: F401
+Attributes are loaded lazily, so that ``cmeel.run`` wrappers of executables and
+the ``cmeel`` helpers do not pay for the import of the whole build backend.
+"""
 
-from .build import build_editable, build_sdist, build_wheel
-from .cmeel import __author__, __license__, __project_name__, __version__
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    # ruff: noqa: F401
+    from .build import (
+        build_editable,
+        build_sdist,
+        build_wheel,
+        get_requires_for_build_editable,
+        get_requires_for_build_sdist,
+        get_requires_for_build_wheel,
+        prepare_metadata_for_build_editable,
+        prepare_metadata_for_build_wheel,
+    )
+    from .cmeel import __author__, __license__, __project_name__, __version__
+
+BUILD = [
+    "build_editable",
+    "build_sdist",
+    "build_wheel",
+    "get_requires_for_build_editable",
+    "get_requires_for_build_sdist",
+    "get_requires_for_build_wheel",
+    "prepare_metadata_for_build_editable",
+    "prepare_metadata_for_build_wheel",
+]
+METADATA = ["__author__", "__license__", "__project_name__", "__version__"]
+
+
+def __getattr__(name: str) -> Any:
+    """Import build entry points and metadata on first access."""
+    if name in BUILD:
+        from . import build
+
+        return getattr(build, name)
+    if name in METADATA:
+        from . import cmeel
+
+        return getattr(cmeel, name)
+    err = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(err)
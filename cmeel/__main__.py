@@ -6,9 +6,13 @@ import os
 import pathlib
 import sys
 
-from . import __version__
+from .cache import add_cache_arguments, cache
+from .daemon import add_daemon_arguments
+from .dedupe import add_links_arguments, links
 from .docker import add_docker_arguments, docker_build
-from .env import add_paths_arguments, get_paths
+from .env import add_env_arguments, add_paths_arguments, get_env, get_paths
+from .many import add_build_many_arguments
+from .matrix import add_matrix_arguments
 from .release import add_release_arguments, release
 
 LOG = logging.getLogger("cmeel")
@@ -40,8 +44,14 @@ def parse_args() -> argparse.Namespace:
     )
 
     add_paths_arguments(subparsers)
+    add_env_arguments(subparsers)
     add_docker_arguments(subparsers)
     add_release_arguments(subparsers)
+    add_cache_arguments(subparsers)
+    add_matrix_arguments(subparsers)
+    add_links_arguments(subparsers)
+    add_build_many_arguments(subparsers)
+    add_daemon_arguments(subparsers)
 
     ver = subparsers.add_parser("version", help="print current cmeel version.")
     ver.set_defaults(cmd="version")
@@ -71,7 +81,27 @@ def main():
         docker_build(**vars(args))
     elif args.cmd == "release":
         release(**vars(args))
+    elif args.cmd == "cache":
+        cache(**vars(args))
+    elif args.cmd == "matrix":
+        from .matrix import matrix
+
+        matrix(**vars(args))
+    elif args.cmd == "build-many":
+        from .many import build_many
+
+        build_many(**vars(args))
+    elif args.cmd == "daemon":
+        from .daemon import serve
+
+        serve(**vars(args))
+    elif args.cmd == "links":
+        links()
+    elif args.cmd == "env":
+        print(get_env(**vars(args)))
     elif args.cmd == "version":
+        from . import __version__
+
         print(f"This is cmeel version {__version__}")
     else:
         print(get_paths(**vars(args)))
@@ -3,7 +3,8 @@
 import logging
 import os
 
-from .impl import build_impl
+from .daemon import submit
+from .impl import build_impl, metadata_impl
 from .sdist import sdist_impl
 
 LOG = logging.getLogger("cmeel")
@@ -17,15 +18,59 @@ def build_editable(
     """Build an editable wheel: main entry point for PEP 660."""
     LOG.info("cmeel build editable")
     os.environ["CMAKE_INSTALL_MODE"] = "ABS_SYMLINK"
-    return build_impl(wheel_directory, editable=True)
+    name = submit(wheel_directory, True, metadata_directory)
+    if name is not None:
+        return name
+    return build_impl(
+        wheel_directory,
+        editable=True,
+        metadata_directory=metadata_directory,
+    )
 
 
 def build_wheel(wheel_directory, config_settings=None, metadata_directory=None) -> str:
     """Build a binary wheel: main entry point for PEP 517."""
     LOG.info("cmeel build wheel")
-    return build_impl(wheel_directory, editable=False)
+    name = submit(wheel_directory, False, metadata_directory)
+    if name is not None:
+        return name
+    return build_impl(
+        wheel_directory,
+        editable=False,
+        metadata_directory=metadata_directory,
+    )
 
 
 def build_sdist(sdist_directory, config_settings=None) -> str:
     """Generate a gzipped distribution tarball."""
     return sdist_impl(sdist_directory)
+
+
+def get_requires_for_build_wheel(config_settings=None) -> list:
+    """Get additional requirements to build a wheel: everything is in build-system."""
+    return []
+
+
+def get_requires_for_build_editable(config_settings=None) -> list:
+    """Get additional requirements to build an editable wheel."""
+    return []
+
+
+def get_requires_for_build_sdist(config_settings=None) -> list:
+    """Get additional requirements to build a source distribution."""
+    return []
+
+
+def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None) -> str:
+    """Generate the .dist-info directory of a wheel, without running CMake."""
+    LOG.info("cmeel prepare metadata for build wheel")
+    return metadata_impl(metadata_directory)
+
+
+def prepare_metadata_for_build_editable(
+    metadata_directory,
+    config_settings=None,
+) -> str:
+    """Generate the .dist-info directory of an editable wheel, without running CMake."""
+    LOG.info("cmeel prepare metadata for build editable")
+    return metadata_impl(metadata_directory)
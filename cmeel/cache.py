@@ -0,0 +1,337 @@
+"""Content-addressed cache of built wheels, and persistent build trees.
+
+Wheels are stored in ``$XDG_CACHE_HOME/cmeel/wheels/``, under a key computed from
+the sources, the configuration, the relevant environment, the wheel tag and the
+toolchain. The least recently used wheels are evicted above a size limit.
+
+Persistent build trees are kept in ``$XDG_CACHE_HOME/cmeel/builds/``.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sys
+import sysconfig
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import DEVNULL, CalledProcessError, check_output, run
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LOG = logging.getLogger("cmeel.cache")
+
+# cmeel.config and cmeel.cmeel are imported where needed, to keep the cmeel
+# helpers fast: they only need add_cache_arguments from this module.
+
+# Environment variables which may change the content of a wheel
+RELEVANT_ENV = [
+    "CC",
+    "CXX",
+    "CFLAGS",
+    "CXXFLAGS",
+    "CPPFLAGS",
+    "LDFLAGS",
+    "CMAKE_",
+    "CMEEL_CMAKE_ARGS",
+    "PKG_CONFIG_PATH",
+    "MACOSX_DEPLOYMENT_TARGET",
+    "_PYTHON_HOST_PLATFORM",
+]
+
+IGNORED_SOURCES = [".git", "build-editable", "__pycache__"]
+
+# Configure arguments which only change how fast the wheel is built
+JOBS_ARGS = ("-DCMEEL_JOBS=", "-DCMAKE_JOB_POOL")
+
+# CMake cache entries of packages and programs found, eg.
+# "Boost_DIR:PATH=/path/to/boost/cmake" or "Python_EXECUTABLE:FILEPATH=/path/to/python"
+PACKAGE_DIR = re.compile(
+    r"^(\w+_(?:DIR|EXECUTABLE)):(?:PATH|FILEPATH|STRING)=(/.*)$",
+    re.MULTILINE,
+)
+
+# name of a requirement, ref. https://packaging.python.org/en/latest/specifications/dependency-specifiers
+REQUIREMENT = re.compile(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def add_cache_arguments(subparsers):
+    """Append cache command for argparse."""
+    sub = subparsers.add_parser("cache", help="manage the cache of built wheels.")
+    cache_sub = sub.add_subparsers(dest="cache_cmd", required=True)
+    cache_sub.add_parser("stats", help="show cache location, entries and size.")
+    prune = cache_sub.add_parser("prune", help="evict least recently used wheels.")
+    prune.add_argument(
+        "-s",
+        "--max-size",
+        type=int,
+        help="size limit in bytes. Defaults to 'cache-size' configuration.",
+    )
+    prune.add_argument(
+        "-a",
+        "--all",
+        action="store_true",
+        dest="clear",
+        help="empty the cache",
+    )
+    sub.set_defaults(cmd="cache")
+
+
+def cache(
+    cache_cmd: str,
+    max_size: Optional[int] = None,
+    clear: bool = False,
+    **kwargs,
+):
+    """Run a cache subcommand."""
+    from .config import cmeel_config
+
+    if cache_cmd == "stats":
+        entries = get_entries()
+        size = sum(size for _, size in entries)
+        print(f"cache directory: {wheels_dir()}")
+        print(f"entries: {len(entries)}")
+        print(f"size: {size} / {cmeel_config.cache_size} bytes")
+    else:
+        prune(0 if clear else max_size)
+
+
+def wheels_dir() -> Path:
+    """Get the directory where wheels are stored."""
+    from .config import cmeel_config
+
+    return cmeel_config.cache_dir / "wheels"
+
+
+def get_entries() -> List[Tuple[Path, int]]:
+    """List cache entries and their size, least recently used first."""
+    entries = []
+    if wheels_dir().is_dir():
+        for entry in wheels_dir().glob("*/*"):
+            if entry.is_dir() and entry.suffix != ".tmp":
+                entries.append((entry, sum(f.stat().st_size for f in entry.iterdir())))
+    return sorted(entries, key=lambda e: e[0].stat().st_mtime)
+
+
+def prune(max_size: Optional[int] = None):
+    """Evict least recently used wheels until the cache fits in max_size."""
+    from .config import cmeel_config
+
+    if max_size is None:
+        max_size = cmeel_config.cache_size
+    entries = get_entries()
+    size = sum(size for _, size in entries)
+    for entry, entry_size in entries:
+        if size <= max_size:
+            break
+        LOG.info("evict %s", entry)
+        shutil.rmtree(entry, ignore_errors=True)
+        size -= entry_size
+
+
+def hash_sources(source: Path) -> str:
+    """Hash a project tree, with its git tree id if it is clean, or its content."""
+    try:
+        status = check_output(
+            ["git", "status", "--porcelain", "--ignored=no"],
+            cwd=source,
+            text=True,
+            stderr=DEVNULL,
+        )
+        if not status:
+            tree = check_output(["git", "rev-parse", "HEAD^{tree}"], cwd=source)
+            submodules = check_output(
+                ["git", "submodule", "status", "--recursive"],
+                cwd=source,
+            )
+            return hashlib.sha256(tree + submodules).hexdigest()
+    except (CalledProcessError, FileNotFoundError):
+        pass
+
+    sha256 = hashlib.sha256()
+    for root, dirnames, filenames in os.walk(source):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_SOURCES)
+        for name in sorted(filenames):
+            path = Path(root) / name
+            sha256.update(str(path.relative_to(source)).encode() + b"\0")
+            if path.is_file():
+                with path.open("rb") as f:
+                    while chunk := f.read(1 << 20):
+                        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def compiler_identity(env: Dict[str, str]) -> List[str]:
+    """Get the version strings of cmake and the C / C++ compilers."""
+    ret = []
+    for tool in ["cmake", env.get("CC", "cc"), env.get("CXX", "c++")]:
+        cmd = [*tool.split(), "--version"]
+        try:
+            ret.append(run(cmd, capture_output=True, text=True, check=False).stdout)
+        except FileNotFoundError:
+            ret.append(f"{tool} not found")
+    return ret
+
+
+def cache_key(
+    configure_args: List[str],
+    configure_env: Dict[str, str],
+    tag: str,
+    build_number: int,
+    install: Path,
+    requires: List[str],
+) -> str:
+    """Compute the cache key of a wheel."""
+    from .cmeel import __version__
+
+    roots = build_env_roots()
+    sha256 = hashlib.sha256()
+    sha256.update(f"cmeel {__version__}\0{tag}\0{build_number}\0".encode())
+    # the interpreter, but not its path, which may be in the build environment
+    sha256.update(f"{sys.version}\0{sysconfig.get_config_var('SOABI')}\0".encode())
+    sha256.update(hash_sources(Path()).encode())
+    for arg in configure_args:
+        if arg.startswith(JOBS_ARGS):
+            continue
+        # the install prefix is a different temporary directory for each build
+        arg = strip_roots(arg.replace(str(install), "INSTALL"), roots)
+        sha256.update(arg.encode() + b"\0")
+    for requirement in build_requirements(requires):
+        sha256.update(requirement.encode() + b"\0")
+    update_toolchain(sha256, configure_env, roots)
+    return sha256.hexdigest()
+
+
+def build_requirements(requires: List[str]) -> List[str]:
+    """Get the name and installed version of each build requirement."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    ret = []
+    for requirement in requires:
+        match = REQUIREMENT.match(requirement)
+        if match is None:
+            continue
+        try:
+            ret.append(f"{match.group(1)}=={version(match.group(1))}")
+        except PackageNotFoundError:
+            ret.append(f"{match.group(1)} not installed")
+    return sorted(ret)
+
+
+def build_env_roots() -> List[str]:
+    """List prefixes of the build environment, which are new for each isolated build."""
+    roots = set()
+    if sys.prefix != sys.base_prefix:
+        roots.add(sys.prefix)
+    for path in sys.path:
+        # <root>/lib/pythonX.Y/site-packages
+        if path.endswith("site-packages") and not path.startswith(sys.base_prefix):
+            roots.add(str(Path(path).parents[2]))
+    # a root may contain another one
+    return sorted(roots, key=len, reverse=True)
+
+
+def strip_roots(value: str, roots: List[str]) -> str:
+    """Replace paths of the build environment in roots by a placeholder."""
+    for root in roots:
+        value = value.replace(root, "BUILD_ENV")
+    return value
+
+
+def update_toolchain(
+    sha256,
+    configure_env: Dict[str, str],
+    roots: Optional[List[str]] = None,
+):
+    """Update a hash with the relevant environment and the toolchain identity.
+
+    Paths of the build environment in roots are replaced by a placeholder.
+    """
+    for key, value in sorted(configure_env.items()):
+        if any(key.startswith(relevant) for relevant in RELEVANT_ENV):
+            value = strip_roots(value, roots or [])
+            sha256.update(f"{key}={value}\0".encode())
+    for identity in compiler_identity(configure_env):
+        sha256.update(identity.encode())
+
+
+def configure_fingerprint(configure_cmd: List[str], configure_env: Dict[str, str]):
+    """Hash the configure command and the toolchain, to know if it must run again.
+
+    As in cache_key, paths of the build environment are left out: a new isolated
+    build environment does not trigger a configure, unless stale_packages finds
+    that the kept build tree used the previous one.
+    """
+    sha256 = hashlib.sha256()
+    roots = build_env_roots()
+    for arg in configure_cmd:
+        sha256.update(strip_roots(arg, roots).encode() + b"\0")
+    update_toolchain(sha256, configure_env, roots)
+    return sha256.hexdigest()
+
+
+def build_prefix(project: str, tag: str) -> Path:
+    """Get a stable working directory for persistent builds of this project."""
+    from .config import cmeel_config
+
+    source = hashlib.sha256(str(Path.cwd()).encode()).hexdigest()[:16]
+    return cmeel_config.cache_dir / "builds" / f"{project}-{tag}-{source}"
+
+
+@contextmanager
+def lock_prefix(prefix: Path) -> Iterator[None]:
+    """Hold an exclusive lock on a build prefix, after other builds using it."""
+    prefix.mkdir(parents=True, exist_ok=True)
+    with (prefix / "cmeel.lock").open("w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            LOG.info("wait for another build in %s", prefix)
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def stale_packages(cmake_cache: Path) -> List[str]:
+    """List packages and programs found by a kept build tree in paths which are gone.
+
+    eg. in the build environment of a previous isolated build.
+    """
+    if not cmake_cache.exists():
+        return []
+    return [
+        f"{name}={path}"
+        for name, path in PACKAGE_DIR.findall(cmake_cache.read_text(errors="replace"))
+        if not Path(path).exists()
+    ]
+
+
+def get_wheel(key: str, wheel_directory) -> Optional[str]:
+    """Copy the wheel cached for key to wheel_directory, and return its name."""
+    entry = wheels_dir() / key[:2] / key
+    wheels = list(entry.glob("*.whl")) if entry.is_dir() else []
+    if not wheels:
+        LOG.info("cache miss for %s", key)
+        return None
+    LOG.info("cache hit for %s: %s", key, wheels[0].name)
+    shutil.copy(wheels[0], wheel_directory)
+    entry.touch()
+    return wheels[0].name
+
+
+def put_wheel(key: str, wheel: Path):
+    """Store a wheel in cache for key, then evict old entries if needed."""
+    entry = wheels_dir() / key[:2] / key
+    tmp = entry.with_name(f"{key}.{os.getpid()}.tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+    shutil.copy(wheel, tmp)
+    try:
+        tmp.rename(entry)
+    except OSError:
+        # another process stored the same wheel in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+    LOG.info("cached %s for %s", wheel.name, key)
+    prune()
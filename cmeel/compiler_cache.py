@@ -0,0 +1,89 @@
+"""Compiler cache integration, with ccache or sccache.
+
+The tool is used as ``CMAKE_<LANG>_COMPILER_LAUNCHER``, and its hit / miss
+statistics are logged after each build.
+"""
+
+import json
+import logging
+import shutil
+from pathlib import Path
+from subprocess import run
+from typing import Dict, Optional, Tuple
+
+LOG = logging.getLogger("cmeel.compiler_cache")
+
+TOOLS = ["ccache", "sccache"]
+LANGUAGES = ["C", "CXX", "CUDA"]
+
+
+def find_compiler_cache(setting: str) -> Optional[str]:
+    """Get the compiler cache to use from a setting: "off", "auto", or a tool."""
+    if setting.lower() in ("", "0", "no", "off", "false"):
+        return None
+    auto = setting.lower() in ("auto", "1", "yes", "on", "true")
+    candidates = TOOLS if auto else [setting]
+    for candidate in candidates:
+        tool = shutil.which(candidate)
+        if tool is not None:
+            return tool
+    # "auto" only asks for a compiler cache if there is one, eg. in docker images
+    log = LOG.debug if auto else LOG.warning
+    log("compiler cache %s not found", " / ".join(candidates))
+    return None
+
+
+def compiler_cache_env(
+    tool: str,
+    cache_dir: Optional[Path],
+    base_dir: Path,
+) -> Dict[str, str]:
+    """Get the environment to use a compiler cache, in cache_dir if given.
+
+    With ccache, paths under base_dir are made relative, so that builds of sources
+    in different directories share cache entries.
+    """
+    name = Path(tool).name
+    ret = {f"CMAKE_{lang}_COMPILER_LAUNCHER": tool for lang in LANGUAGES}
+    if name == "ccache":
+        ret.update(CCACHE_BASEDIR=str(base_dir), CCACHE_NOHASHDIR="1")
+    if cache_dir is not None:
+        ret[f"{name.upper()}_DIR"] = str(cache_dir / name)
+    return ret
+
+
+def compiler_cache_stats(tool: str, env: Dict[str, str]) -> Optional[Tuple[int, int]]:
+    """Get the total numbers of hits and misses of a compiler cache."""
+    if Path(tool).name == "ccache":
+        cmd = [tool, "--print-stats"]
+    else:
+        cmd = [tool, "--show-stats", "--stats-format", "json"]
+    ret = run(cmd, capture_output=True, text=True, env=env, check=False)
+    if ret.returncode != 0:
+        LOG.debug("can't get compiler cache stats: %s", ret.stderr)
+        return None
+    if Path(tool).name == "ccache":
+        stats = dict(
+            line.split("\t") for line in ret.stdout.splitlines() if "\t" in line
+        )
+        hits = int(stats.get("direct_cache_hit", 0))
+        hits += int(stats.get("preprocessed_cache_hit", 0))
+        return hits, int(stats.get("cache_miss", 0))
+    stats = json.loads(ret.stdout)["stats"]
+    hits = sum(stats["cache_hits"]["counts"].values())
+    return hits, sum(stats["cache_misses"]["counts"].values())
+
+
+def log_compiler_cache_stats(
+    tool: str,
+    env: Dict[str, str],
+    before: Optional[Tuple[int, int]],
+):
+    """Log hits and misses of a compiler cache since before."""
+    after = compiler_cache_stats(tool, env)
+    if before is None or after is None:
+        return
+    hits, misses = after[0] - before[0], after[1] - before[1]
+    total = hits + misses
+    rate = f" ({100 * hits / total:.0f}% hits)" if total else ""
+    LOG.info("%s: %s hits, %s misses%s", Path(tool).name, hits, misses, rate)
@@ -3,6 +3,7 @@
 Parse various configuration files and environment variables.
 """
 
+import logging
 import sys
 from os import environ, pathsep
 from pathlib import Path
@@ -14,8 +15,12 @@ try:
 except ModuleNotFoundError:
     import tomli as tomllib  # type: ignore
 
+from .compiler_cache import compiler_cache_env, find_compiler_cache
 from .consts import CMEEL_PREFIX, SITELIB
 from .env import get_paths
+from .jobs import auto_jobs
+
+LOG = logging.getLogger("cmeel.config")
 
 
 class CmeelConfig:
@@ -37,11 +42,21 @@ class CmeelConfig:
         else:
             self.env = {p: environ[p] for p in ["PATH", "PYTHONPATH"]}
         self.env["CMEEL_BUILD"] = "1"
-        self.jobs = int(self.conf.get("jobs", self.env.get("CMEEL_JOBS", "4")))
-        self.test_jobs = self.conf.get(
-            "test-jobs",
-            self.env.get("CMEEL_TEST_JOBS", "4"),
+        jobs = str(self.conf.get("jobs", self.env.get("CMEEL_JOBS", "4")))
+        test_jobs = str(
+            self.conf.get("test-jobs", self.env.get("CMEEL_TEST_JOBS", "4")),
         )
+        self.link_memory = int(
+            self.conf.get(
+                "link-memory",
+                self.env.get("CMEEL_LINK_MEMORY", 2 << 30),
+            ),
+        )
+        if "auto" in (jobs, test_jobs):
+            auto_compile, auto_link, auto_test = auto_jobs(self.link_memory)
+        self.jobs = auto_compile if jobs == "auto" else int(jobs)
+        self.link_jobs = auto_link if jobs == "auto" else self.jobs
+        self.test_jobs = str(auto_test) if test_jobs == "auto" else test_jobs
         self.temp_dir = Path(
             self.conf.get(
                 "temp-dir",
@@ -51,6 +66,59 @@ class CmeelConfig:
                 ),
             ),
         )
+        cache_home = Path("~/.cache").expanduser()
+        cache_home = Path(environ.get("XDG_CACHE_HOME", cache_home))
+        self.cache = _enabled(self.conf.get("cache", self.env.get("CMEEL_CACHE")))
+        self.persistent_build = _enabled(
+            self.conf.get(
+                "persistent-build",
+                self.env.get("CMEEL_PERSISTENT_BUILD"),
+            ),
+        )
+        self.cache_dir = Path(
+            self.conf.get(
+                "cache-dir",
+                self.env.get("CMEEL_CACHE_DIR", cache_home / "cmeel"),
+            ),
+        )
+        self.cache_size = int(
+            self.conf.get("cache-size", self.env.get("CMEEL_CACHE_SIZE", 10 << 30)),
+        )
+        self.compiler_cache = find_compiler_cache(
+            str(
+                self.conf.get(
+                    "compiler-cache",
+                    self.env.get("CMEEL_COMPILER_CACHE", "off"),
+                ),
+            ),
+        )
+        compiler_cache_dir = self.conf.get(
+            "compiler-cache-dir",
+            self.env.get("CMEEL_COMPILER_CACHE_DIR"),
+        )
+        self.compiler_cache_dir = (
+            None if compiler_cache_dir is None else Path(compiler_cache_dir)
+        )
+        profile = str(self.conf.get("profile", self.env.get("CMEEL_PROFILE", "off")))
+        if profile.lower() == "trace":
+            self.profile = "trace"
+        else:
+            self.profile = "on" if _enabled(profile) else "off"
+        self.daemon = _enabled(
+            self.conf.get("daemon", self.env.get("CMEEL_DAEMON", "off"))
+        )
+        runtime_dir = environ.get("XDG_RUNTIME_DIR")
+        default_socket = (
+            Path(runtime_dir) / "cmeel-daemon.sock"
+            if runtime_dir
+            else self.cache_dir / "daemon.sock"
+        )
+        self.daemon_socket = Path(
+            self.conf.get(
+                "daemon-socket",
+                self.env.get("CMEEL_DAEMON_SOCKET", default_socket),
+            ),
+        )
         self.log_level = self.conf.get(
             "log-level",
             self.env.get("CMEEL_LOG_LEVEL", "WARNING"),
@@ -63,6 +131,8 @@ class CmeelConfig:
         configure_args: List[str],
         configure_env: Dict[str, str],
         run_tests: bool,
+        python: str = sys.executable,
+        sitelib: str = SITELIB,
     ) -> List[str]:
         """Get CMake initial arguments."""
         project = conf["name"]
@@ -72,11 +142,12 @@ class CmeelConfig:
             "-DCMAKE_BUILD_TYPE=Release",
             "-DCMAKE_INSTALL_LIBDIR=lib",
             f"-DCMAKE_INSTALL_PREFIX={install}",
-            f"-DPYTHON_SITELIB={SITELIB}",
-            f"-DPython_EXECUTABLE={sys.executable}",
-            f"-DPython3_EXECUTABLE={sys.executable}",
+            f"-DPYTHON_SITELIB={sitelib}",
+            f"-DPython_EXECUTABLE={python}",
+            f"-DPython3_EXECUTABLE={python}",
             "-DCMAKE_APPLE_SILICON_PROCESSOR=arm64",
             f"-DCMEEL_JOBS={self.jobs}",
+            *self._get_job_pools(),
             *build_testing,
             *configure_args,
             *self.conf.get("configure-args", []),
@@ -85,11 +156,17 @@ class CmeelConfig:
             ret += self.conf[project].get("configure-args", [])
         if configure_env.get("CMEEL_CMAKE_ARGS"):
             ret += configure_env["CMEEL_CMAKE_ARGS"].split()
+        if self.link_jobs < self.jobs and "Ninja" not in _generator(ret, configure_env):
+            LOG.warning(
+                "link jobs are only limited to %s with Ninja: set CMAKE_GENERATOR=Ninja",
+                self.link_jobs,
+            )
         return ret
 
-    def get_configure_env(self) -> Dict[str, str]:
-        """Get CMake initial environment."""
+    def get_configure_env(self, source: Union[Path, str] = ".") -> Dict[str, str]:
+        """Get CMake initial environment, for a source directory."""
         ret = self.env.copy()
+        self._add_compiler_cache_env(ret, source)
         available = self._get_available_prefix()
         if available:
             cpp = ret.get("CMAKE_PREFIX_PATH", "")
@@ -103,6 +180,12 @@ class CmeelConfig:
             ret["PKG_CONFIG_PATH"] = pcp.strip(pathsep)
         return ret
 
+    def get_build_env(self, source: Union[Path, str] = ".") -> Dict[str, str]:
+        """Get CMake build environment, for a source directory."""
+        ret = self.env.copy()
+        self._add_compiler_cache_env(ret, source)
+        return ret
+
     def get_test_env(self) -> Dict[str, str]:
         """Get test environment."""
         ret = self.env.copy()
@@ -113,6 +196,29 @@ class CmeelConfig:
         )
         return ret
 
+    def _add_compiler_cache_env(self, env: Dict[str, str], source: Union[Path, str]):
+        """Use the compiler cache, unless the user already configured it."""
+        if self.compiler_cache is None:
+            return
+        # paths of sources are then relative to their root
+        compiler_env = compiler_cache_env(
+            self.compiler_cache,
+            self.compiler_cache_dir,
+            Path(source).absolute(),
+        )
+        for key, value in compiler_env.items():
+            env.setdefault(key, value)
+
+    def _get_job_pools(self) -> List[str]:
+        """Limit parallel link steps with Ninja job pools, if they are limited."""
+        if self.link_jobs >= self.jobs:
+            return []
+        return [
+            f"-DCMAKE_JOB_POOLS=cmeel_compile={self.jobs};cmeel_link={self.link_jobs}",
+            "-DCMAKE_JOB_POOL_COMPILE=cmeel_compile",
+            "-DCMAKE_JOB_POOL_LINK=cmeel_link",
+        ]
+
     def _get_available_prefix(self) -> Optional[Path]:
         for path in sys.path:
             if CMEEL_PREFIX in path:
@@ -120,4 +226,22 @@ class CmeelConfig:
         return None
 
 
+def _generator(configure_args: List[str], configure_env: Dict[str, str]) -> str:
+    """Get the CMake generator from configure arguments or the environment."""
+    ret = configure_env.get("CMAKE_GENERATOR", "")
+    for i, arg in enumerate(configure_args):
+        if arg == "-G" and i + 1 < len(configure_args):
+            ret = configure_args[i + 1]
+        elif arg.startswith("-G"):
+            ret = arg[2:]
+    return ret
+
+
+def _enabled(value: Union[bool, str, None]) -> bool:
+    """Parse a boolean setting, from a configuration file or the environment."""
+    if value is None:
+        return False
+    return str(value).upper() not in ("0", "NO", "OFF", "FALSE")
+
+
 cmeel_config = CmeelConfig()
@@ -10,4 +10,6 @@ SITELIB = os.path.join(  # noqa: PTH118
     "python" + ".".join(sys.version.split(".")[:2]),
     "site-packages",
 )
+LINKS = os.path.join("share", "cmeel", "links")  # noqa: PTH118
+RESTORED = LINKS + ".restored"
 # ^^^
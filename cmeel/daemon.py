@@ -0,0 +1,401 @@
+"""Local build daemon, keeping build trees of projects configured between builds.
+
+``cmeel daemon`` listens on a Unix socket. When it runs, the PEP 517 hooks send it
+their build instead of building in-process. Builds run in processes forked from a
+server which already imported cmeel, in persistent build trees, so that the
+configure step is skipped while its fingerprint does not change. Builds beyond
+``--parallel`` are queued, and each one gets a share of the ``--jobs`` CPUs.
+
+Sources of the projects built are polled for changes, and their build trees are
+then rebuilt in the background when a slot is free, so that they stay warm.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+LOG = logging.getLogger("cmeel.daemon")
+
+# directories of sources which are not watched
+SKIP = ("build", "__pycache__", "wh", "dist")
+
+
+def add_daemon_arguments(subparsers):
+    """Append daemon command for argparse."""
+    sub = subparsers.add_parser(
+        "daemon",
+        help="run a local build daemon, used by pip builds on this machine.",
+    )
+    sub.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="CPUs shared by all builds. Default to the available CPUs.",
+    )
+    sub.add_argument(
+        "-p",
+        "--parallel",
+        type=int,
+        default=2,
+        help="number of concurrent builds, others are queued. Default to 2.",
+    )
+    sub.add_argument(
+        "-s",
+        "--socket",
+        help="socket path. Default to the daemon-socket setting.",
+    )
+    sub.add_argument(
+        "-w",
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="seconds between checks of sources for changes, 0 to disable. "
+        "Default to 2.",
+    )
+    sub.set_defaults(cmd="daemon")
+
+
+def source_stamp(source: Path) -> Tuple[int, int]:
+    """Get the number of files of a source tree and their latest mtime."""
+    count, latest = 0, 0
+    with os.scandir(source) as it:
+        for entry in it:
+            if entry.name.startswith(".") or entry.name.startswith(SKIP):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                sub_count, sub_latest = source_stamp(Path(entry.path))
+                count, latest = count + sub_count, max(latest, sub_latest)
+            else:
+                count += 1
+                latest = max(latest, entry.stat(follow_symlinks=False).st_mtime_ns)
+    return count, latest
+
+
+def request(wheel_directory, editable: bool, metadata_directory) -> Dict:
+    """Describe a build of the current project by this interpreter."""
+    from .cache import build_prefix
+    from .cmeel import __version__
+    from .impl import load_pyproject
+    from .utils import get_tag
+
+    if editable:
+        prefix = Path("build-editable")
+    else:
+        pyproject, conf, _ = load_pyproject()
+        prefix = build_prefix(conf["name"], get_tag(pyproject))
+    return {
+        "cwd": str(Path.cwd()),
+        "prefix": str(prefix.absolute()),
+        "env": dict(os.environ),
+        "path": sys.path,
+        "executable": sys.executable,
+        "version": sys.version,
+        "cmeel": __version__,
+        "wheel_directory": str(Path(wheel_directory).absolute()),
+        "editable": editable,
+        "metadata_directory": (
+            None
+            if metadata_directory is None
+            else str(Path(metadata_directory).absolute())
+        ),
+    }
+
+
+def submit(wheel_directory, editable: bool, metadata_directory) -> Optional[str]:
+    """Build through the daemon, if it runs. Return the wheel name, or None."""
+    from .config import cmeel_config
+
+    if not cmeel_config.daemon or not cmeel_config.daemon_socket.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(cmeel_config.daemon_socket))
+    except OSError as e:
+        LOG.debug("no cmeel daemon on %s: %s", cmeel_config.daemon_socket, e)
+        return None
+    LOG.info("build with cmeel daemon on %s", cmeel_config.daemon_socket)
+    with client, client.makefile("rw") as f:
+        f.write(json.dumps(request(wheel_directory, editable, metadata_directory)))
+        f.write("\n")
+        f.flush()
+        for line in f:
+            message = json.loads(line)
+            if "log" in message:
+                sys.stderr.write(message["log"])
+            elif "wheel" in message:
+                return message["wheel"]
+            elif "unsupported" in message:
+                LOG.info("cmeel daemon can't build this: %s", message["unsupported"])
+                return None
+            else:
+                sys.stderr.flush()
+                err = f"cmeel daemon build failed:\n{message['error']}"
+                raise RuntimeError(err)
+    err = "cmeel daemon closed the connection during the build"
+    raise RuntimeError(err)
+
+
+def worker(message: Dict, jobs: int, conn):
+    """Build in a process of the fork server, with the environment of the client."""
+    read, write = os.pipe()
+    os.dup2(write, 1)
+    os.dup2(write, 2)
+    os.close(write)
+
+    def relay():
+        with os.fdopen(read, errors="replace") as f:
+            for line in f:
+                conn.send({"log": line})
+
+    relay_thread = threading.Thread(target=relay, daemon=True)
+    relay_thread.start()
+
+    try:
+        os.chdir(message["cwd"])
+        os.environ.clear()
+        os.environ.update(message["env"])
+        # only as defaults: settings of the client take precedence
+        os.environ.setdefault("CMEEL_PERSISTENT_BUILD", "1")
+        os.environ.setdefault("CMEEL_JOBS", str(jobs))
+        os.environ.setdefault("CMEEL_TEST_JOBS", str(jobs))
+        sys.path[:] = message["path"]
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+
+        from .config import cmeel_config
+        from .impl import build_impl
+
+        # read the configuration again, with the environment of the client
+        cmeel_config.__init__()  # type: ignore[misc]
+        name = build_impl(
+            message["wheel_directory"],
+            editable=message["editable"],
+            metadata_directory=message["metadata_directory"],
+        )
+        if message["editable"] or cmeel_config.persistent_build:
+            build: Optional[Path] = Path(message["prefix"]) / "bld"
+        else:
+            build = None
+        result = {"wheel": name, "build": None if build is None else str(build)}
+    except Exception:  # noqa: BLE001
+        # any error of the build is reported to the client
+        result = {"error": traceback.format_exc()}
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.close(1)
+    os.close(2)
+    relay_thread.join()
+    conn.send(result)
+
+
+class Tree:
+    """A build tree kept by the daemon, with the stamp of its sources."""
+
+    def __init__(self, source: Path, build: Path, env: Dict[str, str]) -> None:
+        """Record a build tree after a build."""
+        self.source = source
+        self.build = build
+        self.env = env
+        self.stamp = source_stamp(source)
+        # stamp of the sources when a background rebuild last failed
+        self.failed: Optional[Tuple[int, int]] = None
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Build requests server, with a global limit of concurrent builds."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, jobs: int, parallel: int) -> None:
+        """Listen on path, for builds sharing jobs CPUs, parallel at a time."""
+        super().__init__(path, Handler)
+        self.jobs = jobs
+        self.share = max(1, jobs // parallel)
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.lock = threading.Lock()
+        self.prefixes: Dict[str, threading.Lock] = {}
+        self.trees: Dict[str, Tree] = {}
+        self.context = multiprocessing.get_context("forkserver")
+        self.context.set_forkserver_preload(["cmeel.impl"])
+
+    def prefix_lock(self, prefix: str) -> threading.Lock:
+        """Get the lock of a build prefix, which is used by one build at a time."""
+        with self.lock:
+            return self.prefixes.setdefault(prefix, threading.Lock())
+
+    def unsupported(self, message: Dict) -> Optional[str]:
+        """Check if a build must run in the client instead."""
+        from .cmeel import __version__
+
+        if message["executable"] != sys.executable:
+            return f"{message['executable']} is not {sys.executable}"
+        if message["version"] != sys.version:
+            return f"python {message['version']} is not {sys.version}"
+        if message["cmeel"] != __version__:
+            return f"cmeel {message['cmeel']} is not {__version__}"
+        return None
+
+    def build(self, message: Dict, send):
+        """Run a build in a worker process, and relay its messages."""
+        parent, child = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=worker,
+            args=(message, self.share, child),
+        )
+        start = time.perf_counter()
+        process.start()
+        child.close()
+        result: Dict = {"error": "the build process ended without result"}
+        while True:
+            try:
+                received = parent.recv()
+            except EOFError:
+                break
+            if "log" in received:
+                send(received)
+            else:
+                result = received
+        process.join()
+        LOG.info(
+            "%s: %s in %.1fs",
+            message["cwd"],
+            "ok" if "wheel" in result else "failed",
+            time.perf_counter() - start,
+        )
+        if result.get("build"):
+            source = Path(message["cwd"])
+            with self.lock:
+                self.trees[message["prefix"]] = Tree(
+                    source, Path(result["build"]), message["env"]
+                )
+        send(result)
+
+    def watch(self, interval: float):
+        """Rebuild trees whose sources changed, when a slot is free."""
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                trees = list(self.trees.items())
+            for prefix, tree in trees:
+                try:
+                    stamp = source_stamp(tree.source) if tree.build.is_dir() else None
+                except OSError as e:
+                    LOG.debug("can't stamp %s: %s", tree.source, e)
+                    stamp = None
+                if stamp is None:
+                    # sources or build tree were removed
+                    LOG.info("stop watching %s", tree.source)
+                    with self.lock:
+                        if self.trees.get(prefix) is tree:
+                            del self.trees[prefix]
+                    continue
+                if stamp in (tree.stamp, tree.failed):
+                    continue
+                if not self.slots.acquire(blocking=False):
+                    break
+                try:
+                    with self.prefix_lock(prefix):
+                        self.rebuild(tree, stamp)
+                finally:
+                    self.slots.release()
+
+    def rebuild(self, tree: Tree, stamp: Tuple[int, int]):
+        """Build a tree again in the background, with the environment of its build."""
+        LOG.info("%s changed: rebuild %s", tree.source, tree.build)
+        cmd = ["cmake", "--build", str(tree.build), f"-j{self.share}"]
+        try:
+            # the environment may refer to build environments which are gone
+            proc = subprocess.run(
+                cmd,
+                env=tree.env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                errors="replace",
+                check=False,
+            )
+            returncode, output = proc.returncode, proc.stdout
+        except OSError as e:
+            returncode, output = -1, str(e)
+        if returncode == 0:
+            tree.stamp = stamp
+        else:
+            # retry when sources change again
+            tree.failed = stamp
+            tail = "".join(output.splitlines(keepends=True)[-20:])
+            LOG.warning(
+                "background rebuild of %s failed (%d):\n%s",
+                tree.build,
+                returncode,
+                tail,
+            )
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Handle one build request."""
+
+    server: Server
+
+    def send(self, message: Dict):
+        """Send a message to the client."""
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        """Queue a build, run it, and send its output and result."""
+        message = json.loads(self.rfile.readline())
+        reason = self.server.unsupported(message)
+        if reason is not None:
+            self.send({"unsupported": reason})
+            return
+        LOG.info("build request for %s", message["cwd"])
+        if not self.server.slots.acquire(blocking=False):
+            self.send({"log": "cmeel daemon: all slots are busy, build queued\n"})
+            self.server.slots.acquire()
+        try:
+            with self.server.prefix_lock(message["prefix"]):
+                self.server.build(message, self.send)
+        finally:
+            self.server.slots.release()
+
+
+def serve(
+    jobs: Optional[int],
+    parallel: int,
+    socket: Optional[str],
+    watch_interval: float,
+    **kwargs,
+):
+    """Run the daemon, until interrupted."""
+    from .config import cmeel_config
+    from .jobs import available_cpus
+
+    path = Path(socket) if socket else cmeel_config.daemon_socket
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    server = Server(str(path), jobs or available_cpus(), parallel)
+    if watch_interval > 0:
+        threading.Thread(
+            target=server.watch, args=(watch_interval,), daemon=True
+        ).start()
+    print(
+        f"cmeel daemon on {path}: {parallel} concurrent builds, "
+        f"{server.share} jobs each",
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
@@ -0,0 +1,183 @@
+"""Keep a single copy of symlinked or identical shared libraries of the install prefix.
+
+Wheels can't hold symlinks, so each link of eg. ``libfoo.so -> libfoo.so.1 ->
+libfoo.so.1.2.3`` would be packed as a full copy of the library. Instead, each group
+of identical shared libraries is packed once, under its SONAME so that the dynamic
+loader finds it, and the others are listed in a manifest in
+``cmeel.prefix/share/cmeel/links``. They are restored as symlinks by ``cmeel.pth``
+at the next interpreter startup, or by ``cmeel links``.
+
+Those symlinks are not in the ``RECORD`` of the wheel. The symlinks created are
+listed in ``cmeel.prefix/share/cmeel/links.restored``, which is newer than the
+manifests once they are restored, and symlinks which are no longer in a manifest,
+eg. after an uninstall, are removed at the next restoration.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .consts import CMEEL_PREFIX, LINKS, RESTORED
+from .elf import ET_DYN, ELFError, open_elf
+from .env import get_prefixes
+from .inventory import Inventory
+
+LOG = logging.getLogger("cmeel.dedupe")
+
+
+def add_links_arguments(subparsers):
+    """Append links command for argparse."""
+    sub = subparsers.add_parser(
+        "links",
+        help="restore files deduplicated in cmeel wheels, as symlinks",
+    )
+    sub.set_defaults(cmd="links")
+
+
+def find_groups(inventory: Inventory, jobs: int) -> List[List[Path]]:
+    """Find groups of paths with the same content: symlinks, hard links and copies."""
+    install = inventory.root.resolve()
+    files: Dict[Tuple[int, int], List[Path]] = {}
+    sizes: Dict[int, List[Tuple[int, int]]] = {}
+    links: Dict[Path, Path] = {}
+    for entry in inventory:
+        if entry.is_link:
+            target = entry.path.resolve()
+            # keep links to directories, or outside of the install prefix
+            if target.is_file() and install in target.parents:
+                links[entry.path] = inventory.root / target.relative_to(install)
+        elif entry.size:
+            if entry.inode not in files:
+                sizes.setdefault(entry.size, []).append(entry.inode)
+            files.setdefault(entry.inode, []).append(entry.path)
+
+    # only hash files which have the same size as another one
+    candidates = [
+        inode for inodes in sizes.values() if len(inodes) > 1 for inode in inodes
+    ]
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = executor.map(
+            lambda inode: inventory.entries[files[inode][0]].sha256,
+            candidates,
+        )
+        by_content = dict(zip(candidates, digests))
+
+    groups: Dict[object, List[Path]] = {}
+    for inode, paths in files.items():
+        groups.setdefault(by_content.get(inode, inode), []).extend(paths)
+    owner = {path: key for key, paths in groups.items() for path in paths}
+    for link, target in links.items():
+        if target in owner:
+            groups[owner[target]].append(link)
+    return [sorted(paths) for paths in groups.values() if len(paths) > 1]
+
+
+def keeper(group: List[Path]) -> Optional[Path]:
+    """Choose where to keep the content of a group of shared libraries: its SONAME."""
+    for path in group:
+        if path.is_symlink():
+            continue
+        try:
+            with open_elf(path) as elf:
+                soname = elf.soname if elf.type == ET_DYN else None
+        except (ELFError, ValueError):
+            # ValueError from mmap for empty files
+            continue
+        if soname is not None and path.parent / soname in group:
+            return path.parent / soname
+    return None
+
+
+def dedupe(inventory: Inventory, distribution: str, jobs: int) -> int:
+    """Keep one copy of each group of identical files, and list the others.
+
+    Return the number of bytes saved in the wheel.
+    """
+    start = time.perf_counter()
+    install = inventory.root
+    groups = find_groups(inventory, jobs)
+    links: List[Tuple[str, str]] = []
+    saved = 0
+    for group in groups.copy():
+        keep = keeper(group)
+        if keep is None:
+            # not a shared library: its copies may be used without cmeel.pth
+            groups.remove(group)
+            continue
+        source = next(path for path in group if not path.is_symlink())
+        saved += source.stat().st_size * (len(group) - 1)
+        for path in group:
+            if path != source:
+                path.unlink()
+        if keep != source:
+            source.rename(keep)
+        for path in group:
+            inventory.update(path)
+        for path in group:
+            if path != keep:
+                target = os.path.relpath(keep, path.parent)
+                links.append((path.relative_to(install).as_posix(), target))
+                LOG.debug("%s -> %s", path, target)
+    if links:
+        manifest = install / LINKS / f"{distribution}.txt"
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+        with manifest.open("w") as f:
+            f.writelines(f"{link}\t{target}\n" for link, target in sorted(links))
+        inventory.update(manifest)
+    LOG.info(
+        "deduplicated %d files in %d groups, saving %d bytes in %.3fs",
+        len(links),
+        len(groups),
+        saved,
+        time.perf_counter() - start,
+    )
+    return saved
+
+
+def read_manifests(links_dir: Path) -> Dict[str, str]:
+    """Read the symlinks to create, and their targets, from the manifests."""
+    wanted = {}
+    for manifest in sorted(links_dir.iterdir()):
+        for line in manifest.read_text().splitlines():
+            link, target = line.split("\t")
+            wanted[link] = target
+    return wanted
+
+
+def restore_links(prefix: Path) -> int:
+    """Create symlinks listed in the manifests of a cmeel prefix, and remove old ones."""
+    # vvv Warning: keep sync with cmeel_pth.py
+    links_dir, restored = prefix / LINKS, prefix / RESTORED
+    wanted = read_manifests(links_dir) if links_dir.is_dir() else {}
+    previous = restored.read_text().splitlines() if restored.exists() else []
+    for link in previous:
+        path = prefix / link
+        if link not in wanted and path.is_symlink():
+            LOG.info("remove %s", path)
+            path.unlink()
+    created = 0
+    for link, target in wanted.items():
+        path = prefix / link
+        if path.is_symlink() and os.readlink(path) != target:
+            path.unlink()
+        if not path.is_symlink() and not path.exists():
+            LOG.info("%s -> %s", path, target)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.symlink_to(target)
+            created += 1
+    if wanted:
+        restored.parent.mkdir(parents=True, exist_ok=True)
+        restored.write_text("".join(f"{link}\n" for link in sorted(wanted)))
+    elif previous:
+        restored.unlink()
+    # ^^^
+    return created
+
+
+def links():
+    """Restore deduplicated files in all cmeel prefixes."""
+    created = sum(restore_links(prefix) for prefix in get_prefixes())
+    print(f"restored {created} links in {CMEEL_PREFIX}")
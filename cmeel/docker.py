@@ -1,15 +1,37 @@
-"""Build a project with cmeel in a container."""
+"""Build a project with cmeel in containers.
+
+Multiple images and interpreters can be given: containers are then run
+concurrently, and share a global CPU budget. Each one builds its own copy of the
+sources, and its wheels are then copied to the ``wh`` directory of the project.
+"""
 
 import logging
 import os
 import pathlib
-from subprocess import check_call
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import PIPE, STDOUT, CalledProcessError, Popen, check_call
+from tempfile import mkdtemp
+from threading import Lock
 from typing import List, Optional
 
 from .backports import BooleanOptionalAction
+from .jobs import available_cpus
 
 LOG = logging.getLogger("cmeel.docker")
 
+# where the compiler cache directory of the host is bound in containers
+COMPILER_CACHE = "/root/.cache/cmeel-compiler-cache"
+
+# pip wheel output for each wheel built
+SAVED = re.compile(r"Saved (\S+\.whl)")
+
+# not copied in the sources of concurrent containers
+IGNORED_SOURCES = shutil.ignore_patterns("wh", "build", "build-*", "__pycache__")
+
 
 def add_docker_arguments(subparsers):
     """Append docker command for argparse."""
@@ -17,14 +39,27 @@ def add_docker_arguments(subparsers):
     sub.add_argument(
         "-i",
         "--image",
-        default="quay.io/pypa/manylinux_2_28_x86_64",
-        help="docker image to use for building the wheel",
+        nargs="+",
+        default=["quay.io/pypa/manylinux_2_28_x86_64"],
+        help="docker images to use for building the wheel",
     )
     sub.add_argument(
         "-p",
         "--python",
-        default="python3.13",
-        help="python interpreter inside that image",
+        nargs="+",
+        default=["python3.13"],
+        help="python interpreters inside those images",
+    )
+    sub.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="CPUs shared by all containers. Default to the available CPUs.",
+    )
+    sub.add_argument(
+        "--docker",
+        default="docker",
+        help="docker executable. Default to 'docker'.",
     )
     sub.add_argument(
         "-u",
@@ -44,6 +79,12 @@ def add_docker_arguments(subparsers):
         action="store_true",
         help="binds /root/.cache/pip",
     )
+    sub.add_argument(
+        "-k",
+        "--compiler-cache",
+        action="store_true",
+        help="use ccache / sccache, and binds its cache directory",
+    )
     sub.add_argument(
         "-C",
         "--cwd",
@@ -65,42 +106,200 @@ def add_docker_arguments(subparsers):
     sub.set_defaults(cmd="docker")
 
 
+class Container:
+    """A build of the project for one image and one interpreter."""
+
+    def __init__(
+        self,
+        image: str,
+        python: str,
+        cmd: List[str],
+        source: Optional[pathlib.Path] = None,
+    ) -> None:
+        """Prepare a build, in a copy of the sources if given."""
+        self.image = image
+        self.python = python
+        self.cmd = cmd
+        self.source = source
+        self.label = f"{image.rsplit('/', 1)[-1]}/{python}"
+        self.returncode: Optional[int] = None
+        self.duration = 0.0
+        self.wheels: List[str] = []
+
+    def run(self, lock: Lock) -> None:
+        """Run this build, and print its output lines prefixed with its label."""
+        LOG.info("running '%s'", self.cmd)
+        start = time.perf_counter()
+        with Popen(
+            self.cmd,
+            stdout=PIPE,
+            stderr=STDOUT,
+            text=True,
+            errors="replace",
+        ) as proc:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                saved = SAVED.search(line)
+                if saved:
+                    self.wheels.append(saved.group(1))
+                with lock:
+                    sys.stdout.write(f"[{self.label}] {line}")
+                    sys.stdout.flush()
+        self.returncode = proc.returncode
+        self.duration = time.perf_counter() - start
+
+    def collect(self, wheel_dir: pathlib.Path) -> None:
+        """Copy wheels built in a copy of the sources."""
+        if self.source is None:
+            return
+        wheel_dir.mkdir(parents=True, exist_ok=True)
+        for wheel in sorted((self.source / "wh").glob("*.whl")):
+            LOG.info("copy %s to %s", wheel.name, wheel_dir)
+            shutil.copy(wheel, wheel_dir)
+
+
+def summary(containers: List[Container]) -> str:
+    """Show a table of the builds, their status, duration, and wheels."""
+    rows = [["image", "python", "status", "duration", "wheels"]]
+    for c in containers:
+        status = "ok" if c.returncode == 0 else f"failed ({c.returncode})"
+        rows.append(
+            [c.image, c.python, status, f"{c.duration:.1f}s", " ".join(c.wheels)],
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+    return "\n".join(
+        "  ".join([*(cell.ljust(w) for cell, w in zip(row, widths)), row[-1]])
+        for row in rows
+    )
+
+
+def docker_env(
+    env: Optional[List[str]],
+    cmeel_env: bool,
+    defines: List[str],
+) -> List[str]:
+    """Get docker run arguments to pass or define environment variables.
+
+    Variables of defines, as "NAME=value", override those passed or forwarded.
+    """
+    defined = {d.split("=", 1)[0] for d in defines}
+    envs: List[str] = []
+    if env:
+        for e in env:
+            if e.split("=", 1)[0] not in defined:
+                envs = [*envs, "-e", e]
+    if cmeel_env:
+        for e in os.environ:
+            if e.startswith("CMEEL_") and e not in defined:
+                envs = [*envs, "-e", e]
+    for d in defines:
+        envs = [*envs, "-e", d]
+    return envs
+
+
+def host_compiler_cache() -> pathlib.Path:
+    """Get the compiler cache directory of the host."""
+    from .config import cmeel_config
+
+    if cmeel_config.compiler_cache_dir is not None:
+        return cmeel_config.compiler_cache_dir
+    return cmeel_config.cache_dir / "compiler-cache"
+
+
+def build_cmd(python: str, upgrade: bool) -> List[str]:
+    """Get the command building the wheel inside a container."""
+    build = [python, "-m", "pip", "wheel", "-vw", "wh", "."]
+    if upgrade:
+        pip = [python, "-m", "pip", "install", "-U", "pip"]
+        return ["bash", "-c", f"{' '.join(pip)} && {' '.join(build)}"]
+    return build
+
+
 def docker_build(
-    image: str,
-    python: str,
+    image: List[str],
+    python: List[str],
     update: bool,
     cache: bool,
     upgrade: bool,
     cwd: str,
     env: Optional[List[str]],
     cmeel_env: bool,
+    jobs: Optional[int] = None,
+    docker: str = "docker",
+    compiler_cache: bool = False,
     **kwargs,
 ):
-    """Build a project with cmeel in a container."""
+    """Build a project with cmeel in containers, for each image and interpreter."""
+    builds = [(i, p) for i in image for p in python]
     if update:
-        pull = ["docker", "pull", image]
-        LOG.info("running '%s'", pull)
-        check_call(pull)
+        for i in image:
+            pull = [docker, "pull", i]
+            LOG.info("running '%s'", pull)
+            check_call(pull)
 
-    volumes = ["-v", f"{cwd}/:/src"]
-    envs: List[str] = []
-    if env:
-        for e in env:
-            envs = [*envs, "-e", e]
-    if cmeel_env:
-        for e in os.environ:
-            if e.startswith("CMEEL_"):
-                envs = [*envs, "-e", e]
+    volumes: List[str] = []
+    defines: List[str] = []
+    limits: List[str] = []
+    if jobs is not None or len(builds) > 1:
+        share = max(1, (jobs or available_cpus()) // len(builds))
+        LOG.info("%s containers with %s CPUs each", len(builds), share)
+        defines = [*defines, f"CMEEL_JOBS={share}", f"CMEEL_TEST_JOBS={share}"]
+        limits = [f"--cpus={share}"]
     if cache:
         volumes = [*volumes, "-v", "/root/.cache/pip:/root/.cache/pip"]
-    docker = ["docker", "run", "--rm", *envs, *volumes, "-w", "/src", "-t", image]
-    build = [python, "-m", "pip", "wheel", "-vw", "wh", "."]
-    if upgrade:
-        pip = [python, "-m", "pip", "install", "-U", "pip"]
-        pip_cmd = " ".join(pip)
-        build_cmd = " ".join(build)
-        cmd = [*docker, "bash", "-c", f"{pip_cmd} && {build_cmd}"]
-    else:
-        cmd = [*docker, *build]
-    LOG.info("running '%s'", cmd)
-    check_call(cmd)
+    if compiler_cache:
+        host = host_compiler_cache()
+        host.mkdir(parents=True, exist_ok=True)
+        volumes = [*volumes, "-v", f"{host}:{COMPILER_CACHE}"]
+        tool = os.environ.get("CMEEL_COMPILER_CACHE", "auto")
+        defines = [*defines, f"CMEEL_COMPILER_CACHE={tool}"]
+        defines = [*defines, f"CMEEL_COMPILER_CACHE_DIR={COMPILER_CACHE}"]
+    envs = docker_env(env, cmeel_env, defines)
+
+    if len(builds) == 1:
+        # only allocate a pseudo-TTY when there is no output to prefix
+        i, p = builds[0]
+        docker_cmd = [docker, "run", "--rm", *limits, *envs, *volumes, "-w", "/src"]
+        docker_cmd = [
+            *docker_cmd,
+            "-v",
+            f"{cwd}/:/src",
+            "-t",
+            i,
+            *build_cmd(p, upgrade),
+        ]
+        LOG.info("running '%s'", docker_cmd)
+        check_call(docker_cmd)
+        return
+
+    # concurrent containers must not patch and build the same sources
+    tmp = pathlib.Path(mkdtemp(prefix="cmeel-docker-"))
+    try:
+        containers = []
+        for n, (i, p) in enumerate(builds):
+            source = tmp / str(n)
+            shutil.copytree(cwd, source, symlinks=True, ignore=IGNORED_SOURCES)
+            docker_cmd = [docker, "run", "--rm", *limits, *envs, *volumes]
+            docker_cmd = [*docker_cmd, "-v", f"{source}/:/src", "-w", "/src"]
+            docker_cmd = [*docker_cmd, i, *build_cmd(p, upgrade)]
+            containers.append(Container(i, p, docker_cmd, source))
+        run_containers(containers, pathlib.Path(cwd) / "wh")
+    finally:
+        # files written by containers may belong to another user
+        shutil.rmtree(tmp, ignore_errors=True)
+        if tmp.exists():
+            LOG.warning("%s could not be removed", tmp)
+
+
+def run_containers(containers: List[Container], wheel_dir: pathlib.Path):
+    """Run containers concurrently, collect their wheels, then show a summary."""
+    lock = Lock()
+    with ThreadPoolExecutor(max_workers=len(containers)) as pool:
+        for _ in pool.map(lambda c: c.run(lock), containers):
+            pass
+    for c in containers:
+        c.collect(wheel_dir)
+    print(summary(containers))
+    for c in containers:
+        if c.returncode:
+            raise CalledProcessError(c.returncode, c.cmd)
@@ -0,0 +1,191 @@
+"""Minimal reader for the dynamic section of ELF files.
+
+Only what cmeel needs is parsed: the program headers, the ``DT_NEEDED``,
+``DT_SONAME``, ``DT_RPATH`` and ``DT_RUNPATH`` entries of the dynamic section,
+section names, and the GNU build id.
+"""
+
+import mmap
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"\x7fELF"
+
+ET_EXEC = 2
+ET_DYN = 3
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+DT_NAMES = {
+    DT_NEEDED: "NEEDED",
+    DT_SONAME: "SONAME",
+    DT_RPATH: "RPATH",
+    DT_RUNPATH: "RUNPATH",
+}
+
+
+class ELFError(ValueError):
+    """Exception raised when an ELF file can't be parsed."""
+
+
+def is_elf(data) -> bool:
+    """Check the magic number of the content of a file."""
+    return data[:4] == MAGIC
+
+
+@contextmanager
+def map_file(path: Path) -> Iterator[mmap.mmap]:
+    """Map a non-empty file in memory, read-only."""
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        yield m
+
+
+@contextmanager
+def open_elf(path: Path) -> Iterator["ELF"]:
+    """Parse an ELF file from a read-only memory map."""
+    with map_file(path) as m:
+        yield ELF(m)
+
+
+class ELF:
+    """Dynamic section of an ELF executable or shared library."""
+
+    def __init__(self, data) -> None:
+        """Parse the content of a file, as bytes or a memory map."""
+        if not is_elf(data):
+            err = "not an ELF file"
+            raise ELFError(err)
+        self.data = data
+        self.is64 = data[4] == 2
+        self.endian = "<" if data[5] == 1 else ">"
+        self.type = self._unpack("H", 16)[0]
+        # (tag, value, offset of the entry in the file)
+        self.dynamic: List[Tuple[int, int, int]] = []
+        self.strtab: Optional[int] = None
+        if self.type in (ET_EXEC, ET_DYN):
+            self._read_dynamic()
+
+    def _unpack(self, fmt: str, offset: int) -> Tuple[int, ...]:
+        try:
+            return struct.unpack_from(self.endian + fmt, self.data, offset)
+        except struct.error as e:
+            err = f"truncated ELF file: {e}"
+            raise ELFError(err) from e
+
+    def _segments(self) -> List[Tuple[int, int, int, int]]:
+        """Get (type, offset, virtual address, file size) of program headers."""
+        if self.is64:
+            phoff = self._unpack("Q", 0x20)[0]
+            phentsize, phnum = self._unpack("HH", 0x36)
+        else:
+            phoff = self._unpack("I", 0x1C)[0]
+            phentsize, phnum = self._unpack("HH", 0x2A)
+        ret = []
+        for i in range(phnum):
+            offset = phoff + i * phentsize
+            if self.is64:
+                p_type, _, p_offset, p_vaddr, _, p_filesz = self._unpack(
+                    "IIQQQQ",
+                    offset,
+                )
+            else:
+                p_type, p_offset, p_vaddr, _, p_filesz = self._unpack("IIIII", offset)
+            ret.append((p_type, p_offset, p_vaddr, p_filesz))
+        return ret
+
+    def _read_dynamic(self) -> None:
+        segments = self._segments()
+        dynamic = [s for s in segments if s[0] == PT_DYNAMIC]
+        if not dynamic:
+            # statically linked
+            return
+        _, offset, _, size = dynamic[0]
+        fmt, entsize = ("qQ", 16) if self.is64 else ("iI", 8)
+        for entry in range(offset, offset + size, entsize):
+            tag, value = self._unpack(fmt, entry)
+            if tag == DT_NULL:
+                break
+            self.dynamic.append((tag, value, entry))
+            if tag == DT_STRTAB:
+                self.strtab = self._address_to_offset(segments, value)
+
+    def _address_to_offset(self, segments, address: int) -> Optional[int]:
+        for p_type, p_offset, p_vaddr, p_filesz in segments:
+            if p_type == PT_LOAD and p_vaddr <= address < p_vaddr + p_filesz:
+                return address - p_vaddr + p_offset
+        return None
+
+    def sections(self) -> Dict[str, Tuple[int, int]]:
+        """Get the offset and size of each section, by name."""
+        if self.is64:
+            shoff = self._unpack("Q", 0x28)[0]
+            shentsize, shnum, shstrndx = self._unpack("HHH", 0x3A)
+            fmt = "IIQQQQ"
+        else:
+            shoff = self._unpack("I", 0x20)[0]
+            shentsize, shnum, shstrndx = self._unpack("HHH", 0x2E)
+            fmt = "IIIIII"
+        if shoff == 0 or shstrndx >= shnum:
+            return {}
+        headers = [self._unpack(fmt, shoff + i * shentsize) for i in range(shnum)]
+        names = headers[shstrndx][4]
+        ret = {}
+        for sh_name, _, _, _, sh_offset, sh_size in headers:
+            end = self.data.find(b"\0", names + sh_name)
+            name = bytes(self.data[names + sh_name : end]).decode(errors="replace")
+            ret[name] = (sh_offset, sh_size)
+        return ret
+
+    @property
+    def build_id(self) -> Optional[str]:
+        """Get the GNU build id, as hexadecimal, if any."""
+        note = self.sections().get(".note.gnu.build-id")
+        if note is None:
+            return None
+        offset, _ = note
+        namesz, descsz, _ = self._unpack("III", offset)
+        start = offset + 12 + (namesz + 3) // 4 * 4
+        return bytes(self.data[start : start + descsz]).hex()
+
+    def string(self, value: int) -> str:
+        """Get a string from the dynamic string table."""
+        if self.strtab is None:
+            err = "no dynamic string table"
+            raise ELFError(err)
+        start = self.strtab + value
+        end = self.data.find(b"\0", start)
+        return bytes(self.data[start:end]).decode(errors="surrogateescape")
+
+    def entries(self, tag: int) -> List[str]:
+        """Get the string values of the dynamic entries with this tag."""
+        return [self.string(value) for t, value, _ in self.dynamic if t == tag]
+
+    @property
+    def needed(self) -> List[str]:
+        """Get the libraries needed by this file."""
+        return self.entries(DT_NEEDED)
+
+    @property
+    def soname(self) -> Optional[str]:
+        """Get the SONAME of this shared library, if any."""
+        sonames = self.entries(DT_SONAME)
+        return sonames[0] if sonames else None
+
+    @property
+    def runpath(self) -> List[str]:
+        """Get RUNPATH entries, or RPATH entries if there is no RUNPATH."""
+        for tag in (DT_RUNPATH, DT_RPATH):
+            paths = self.entries(tag)
+            if paths:
+                return [p for p in paths[0].split(":") if p]
+        return []
@@ -1,8 +1,11 @@
 """Tools to help environment management."""
 
+import json
 import os
 import pathlib
+import shlex
 import sys
+from typing import Dict, List, Optional
 
 from .consts import CMEEL_PREFIX
 
@@ -12,6 +15,8 @@ PATHS = {
     "pc": "PKG_CONFIG_PATH",
 }
 
+FORMATS = ["sh", "fish", "json", "dotenv"]
+
 
 def add_paths_arguments(subparsers):
     """Append paths commands for argparse."""
@@ -21,15 +26,46 @@ def add_paths_arguments(subparsers):
         sub.set_defaults(cmd=cmd)
 
 
-def get_paths(cmd: str, prepend: bool = False, **kwargs) -> str:
-    """Get the paths needed by the user."""
+def add_env_arguments(subparsers):
+    """Append env command for argparse."""
+    sub = subparsers.add_parser(
+        "env",
+        help=f"show cmeel additions to {', '.join(PATHS.values())}",
+    )
+    sub.add_argument("--prepend", action="store_true", help="show full variables")
+    sub.add_argument(
+        "-f",
+        "--format",
+        choices=FORMATS,
+        default="sh",
+        help="output format. Default to 'sh'.",
+    )
+    sub.set_defaults(cmd="env")
+
+
+def get_prefixes() -> List[pathlib.Path]:
+    """Find cmeel prefixes in sys.path."""
     prefixes = [pathlib.Path(path) / CMEEL_PREFIX for path in sys.path]
+    return [p for p in prefixes if p.is_dir()]
+
+
+def get_paths(
+    cmd: str,
+    prepend: bool = False,
+    prefixes: Optional[List[pathlib.Path]] = None,
+    **kwargs,
+) -> str:
+    """Get the paths needed by the user."""
+    if prefixes is None:
+        prefixes = get_prefixes()
     if cmd == "lib":
-        prefixes = [p / "lib" for p in prefixes]
+        dirs = [p / "lib" for p in prefixes]
     elif cmd == "pc":
-        prefixes = [p / sub / "pkgconfig" for p in prefixes for sub in ["lib", "share"]]
+        dirs = [p / sub / "pkgconfig" for p in prefixes for sub in ["lib", "share"]]
+    else:
+        dirs = prefixes
 
-    available = [str(p) for p in prefixes if p.is_dir()]
+    available = [str(p) for p in dirs if cmd == "cmake" or p.is_dir()]
     if prepend:
         ret = []
         for prefix in available + os.environ.get(PATHS[cmd], "").split(os.pathsep):
@@ -37,3 +73,26 @@ def get_paths(cmd: str, prepend: bool = False, **kwargs) -> str:
                 ret.append(prefix)
         return os.pathsep.join(ret)
     return os.pathsep.join(available)
+
+
+def get_env(format: str = "sh", prepend: bool = False, **kwargs) -> str:  # noqa: A002
+    """Get all the variables needed by the user, from a single prefixes discovery."""
+    prefixes = get_prefixes()
+    env: Dict[str, str] = {
+        var: get_paths(cmd, prepend, prefixes) for cmd, var in PATHS.items()
+    }
+    if format == "json":
+        return json.dumps(env)
+    if format == "dotenv":
+        return "\n".join(f"{var}={value}" for var, value in env.items())
+    lines = []
+    for var, value in env.items():
+        # Don't override an existing variable with nothing
+        if not value:
+            continue
+        if format == "fish":
+            paths = " ".join(shlex.quote(p) for p in value.split(os.pathsep))
+            lines.append(f"set -gx {var} {paths}")
+        else:
+            lines.append(f"export {var}={shlex.quote(value)}")
+    return "\n".join(lines)
@@ -2,23 +2,57 @@
 
 import logging
 import os
-import re
-import sys
+import shutil
+from contextlib import nullcontext
 from pathlib import Path
-from subprocess import check_call, check_output
+from subprocess import check_call
+from typing import List, Optional
 
 try:
     import tomllib  # type: ignore
 except ModuleNotFoundError:
     import tomli as tomllib  # type: ignore
 
+from cmeel_editable import write_stamp
+
+from .cache import (
+    build_prefix,
+    cache_key,
+    configure_fingerprint,
+    get_wheel,
+    lock_prefix,
+    put_wheel,
+    stale_packages,
+)
 from .cmeel import __version__
+from .compiler_cache import compiler_cache_stats, log_compiler_cache_stats
 from .config import cmeel_config
 from .consts import CMEEL_PREFIX, SITELIB
+from .dedupe import dedupe
+from .env import get_prefixes
+from .inventory import Inventory, scan_tree
+from .isa import HWCAPS, add_variants, check_levels
 from .metadata import metadata
+from .ninja import analyze
+from .ninja import mark_log as mark_ninja_log
+from .ninja import trace_events as ninja_trace_events
+from .pack import pack
+from .pgo import PGO, add_flags, detect_compiler
+from .relocate import relocate
+from .report import Report
+from .rpath import fix_rpath
+from .scan import scan
+from .strip import (
+    SPLIT_DEBUG,
+    Stripped,
+    debug_tarball,
+    debug_wheel,
+    debug_wheel_dir,
+    strip,
+)
 from .utils import (
+    TEST_CMD,
     deprecate_build_system,
-    ensure_relocatable,
     expose_bin,
     get_tag,
     launch_tests,
@@ -29,19 +63,97 @@ from .utils import (
 
 LOG = logging.getLogger("cmeel.impl")
 
+# build tree of the optimized build of pgo, configured again for each build
+PGO_USE = "bld-pgo-use"
+
+
+def configure(configure_cmd, configure_env, build: Path, persistent: bool):
+    """Run CMake configure, unless a persistent build tree is already up to date."""
+    fingerprint_file = build / "cmeel-configure.sha256"
+    fingerprint = configure_fingerprint(configure_cmd, configure_env)
+    stale = stale_packages(build / "CMakeCache.txt") if persistent else []
+    if stale:
+        LOG.info("packages found in directories which are gone: %s", stale)
+        LOG.info("configure again from scratch")
+        (build / "CMakeCache.txt").unlink()
+        shutil.rmtree(build / "CMakeFiles", ignore_errors=True)
+    if (
+        persistent
+        and (build / "CMakeCache.txt").exists()
+        and fingerprint_file.exists()
+        and fingerprint_file.read_text() == fingerprint
+    ):
+        LOG.info("configure arguments and toolchain did not change: skip configure")
+        return
+    fingerprint_file.unlink(missing_ok=True)
+    check_call(configure_cmd, env=configure_env)
+    if persistent:
+        fingerprint_file.write_text(fingerprint)
 
-def build_impl(wheel_directory, editable=False) -> str:
-    """Run CMake configure / build / test / install steps, and pack the wheel."""
-    logging.basicConfig(level=cmeel_config.log_level.upper())
-    LOG.info("CMake Wheel in editable mode" if editable else "CMake Wheel")
-    LOG.info("cmeel version %s", __version__)
-    log_pip()
 
-    prefix = Path() / "build-editable" if editable else cmeel_config.temp_dir
-    build = prefix / "bld"
-    wheel_dir = prefix / "whl"
-    install = (prefix if editable else wheel_dir) / CMEEL_PREFIX
+class BuildOptions:
+    """Build options from pyproject.toml and the environment."""
+
+    def __init__(self, pyproject) -> None:
+        """Read build options."""
+        self.source = deprecate_build_system(pyproject, "source", ".")
+        self.run_tests = (
+            os.environ.get("CMEEL_RUN_TESTS", "ON").upper()
+            not in ("0", "NO", "OFF", "FALSE")
+            if "CMEEL_RUN_TESTS" in os.environ
+            else deprecate_build_system(pyproject, "run-tests", True)
+        )
+        self.run_tests_after_install = deprecate_build_system(
+            pyproject,
+            "run-tests-after-install",
+            False,
+        )
+        self.build_number = deprecate_build_system(pyproject, "build-number", 0)
+        self.configure_args = deprecate_build_system(pyproject, "configure-args", [])
+        self.check_relocatable = deprecate_build_system(
+            pyproject,
+            "check-relocatable",
+            True,
+        )
+        self.strict_relocatable = deprecate_build_system(
+            pyproject,
+            "strict-relocatable",
+            False,
+        )
+        self.fix_pkg_config = deprecate_build_system(pyproject, "fix-pkg-config", True)
+        self.fix_rpath = deprecate_build_system(pyproject, "fix-rpath", True)
+        self.install_manifest = deprecate_build_system(
+            pyproject,
+            "install-manifest",
+            True,
+        )
+        self.pgo = deprecate_build_system(pyproject, "pgo", False)
+        self.pgo_cmd = deprecate_build_system(
+            pyproject,
+            "pgo-cmd",
+            deprecate_build_system(pyproject, "test-cmd", TEST_CMD),
+        )
+        self.deduplicate = deprecate_build_system(pyproject, "deduplicate", False)
+        self.editable_rebuild = deprecate_build_system(
+            pyproject,
+            "editable-rebuild",
+            False,
+        )
+        self.isa_variants = check_levels(
+            deprecate_build_system(pyproject, "isa-variants", []),
+        )
+        self.split_debug = deprecate_build_system(pyproject, "split-debug", "off")
+        if self.split_debug not in SPLIT_DEBUG:
+            err = f"split-debug must be one of {SPLIT_DEBUG}, not {self.split_debug!r}"
+            raise ValueError(err)
+        self.strip = (
+            deprecate_build_system(pyproject, "strip", False)
+            or self.split_debug != "off"
+        )
 
+
+def load_pyproject():
+    """Load pyproject.toml, and get its normalized project conf and distribution."""
     LOG.info("load conf from pyproject.toml")
     with Path("pyproject.toml").open("rb") as f:
         pyproject = tomllib.load(f)
@@ -49,82 +161,29 @@ def build_impl(wheel_directory, editable=False) -> str:
     conf = pyproject["project"]
     conf["name"] = normalize(conf["name"])
     distribution = f"{conf['name'].replace('-', '_')}-{conf['version']}"
-
-    source = deprecate_build_system(pyproject, "source", ".")
-    run_tests = (
-        os.environ.get("CMEEL_RUN_TESTS", "ON").upper()
-        not in ("0", "NO", "OFF", "FALSE")
-        if "CMEEL_RUN_TESTS" in os.environ
-        else deprecate_build_system(pyproject, "run-tests", True)
-    )
-    run_tests_after_install = deprecate_build_system(
-        pyproject,
-        "run-tests-after-install",
-        False,
-    )
-    build_number = deprecate_build_system(pyproject, "build-number", 0)
-    configure_args = deprecate_build_system(pyproject, "configure-args", [])
-
-    check_relocatable = deprecate_build_system(pyproject, "check-relocatable", True)
-    fix_pkg_config = deprecate_build_system(pyproject, "fix-pkg-config", True)
-
-    LOG.info("build wheel")
-
-    # Patch
-
-    patch()
-
-    # Set env
-
-    if run_tests_after_install:
-        path = f"{install / SITELIB}"
-        old = os.environ.get("PYTHONPATH", "")
-        if old:
-            path += f"{os.pathsep}{old}"
-        os.environ.update(PYTHONPATH=path)
-
-    # Configure
-
-    LOG.info("configure")
-    configure_env = cmeel_config.get_configure_env()
-    configure_args = cmeel_config.get_configure_args(
-        conf,
-        install,
-        configure_args,
-        configure_env,
-        run_tests,
-    )
-    configure_cmd = ["cmake", "-S", source, "-B", str(build), *configure_args]
-    LOG.debug("configure environment: %s", configure_env)
-    LOG.debug("configure command: %s", configure_cmd)
-    check_call(configure_cmd, env=configure_env)
-
-    LOG.info("build")
-    build_cmd = ["cmake", "--build", str(build), f"-j{cmeel_config.jobs}"]
-    LOG.debug("build command: %s", build_cmd)
-    check_call(build_cmd)
-
-    launch_tests(True, run_tests and not run_tests_after_install, pyproject, build)
-
-    LOG.info("install")
-    install_cmd = ["cmake", "--build", str(build), "-t", "install"]
-    LOG.debug("install command: %s", install_cmd)
-    check_call(install_cmd)
-
-    launch_tests(False, run_tests and run_tests_after_install, pyproject, build)
-
-    LOG.info("fix relocatablization")
-    # Replace absolute install path in generated .cmake files, if any.
-    for cmake_file in install.rglob("*.cmake"):
-        ff = install / f"{cmake_file.stem}.fix"
-        with cmake_file.open("r") as fr, ff.open("w") as fw:
-            fw.write(fr.read().replace(str(install), "${PACKAGE_PREFIX_DIR}"))
-        cmake_file.unlink()
-        ff.rename(cmake_file)
+    return pyproject, conf, distribution
+
+
+def create_dist_info(
+    pyproject,
+    conf,
+    wheel_dir: Path,
+    distribution: str,
+    tag: str,
+    build_number: int,
+    metadata_directory=None,
+):
+    """Create the .dist-info directory and its METADATA, top_level.txt and WHEEL.
+
+    If a metadata_directory was prepared earlier, it is used instead.
+    """
+    dist_info = wheel_dir / f"{distribution}.dist-info"
+    if metadata_directory is not None:
+        LOG.info("use dist-info from %s", metadata_directory)
+        shutil.copytree(metadata_directory, dist_info)
+        return
 
     LOG.info("create dist-info")
-
-    dist_info = wheel_dir / f"{distribution}.dist-info"
     dist_info.mkdir(parents=True)
 
     LOG.info("create dist-info / METADATA")
@@ -145,56 +204,478 @@ def build_impl(wheel_directory, editable=False) -> str:
                     "Wheel-Version: 1.0",
                     f"Generator: cmeel {__version__}",
                     "Root-Is-Purelib: false",
-                    f"Tag: {get_tag(pyproject)}",
+                    f"Build: {build_number}",
+                    f"Tag: {tag}",
                     "",
                 ],
             ),
         )
 
-    expose_bin(install, wheel_dir, distribution)
 
-    ensure_relocatable(check_relocatable, install, prefix)
+def metadata_impl(metadata_directory) -> str:
+    """Create the .dist-info directory of the wheel, without building anything."""
+    logging.basicConfig(level=cmeel_config.log_level.upper())
+    LOG.info("cmeel version %s", __version__)
+    pyproject, conf, distribution = load_pyproject()
+    create_dist_info(
+        pyproject,
+        conf,
+        Path(metadata_directory),
+        distribution,
+        get_tag(pyproject),
+        deprecate_build_system(pyproject, "build-number", 0),
+    )
+    return f"{distribution}.dist-info"
+
+
+def build_and_install(
+    report: Report,
+    pyproject,
+    options: BuildOptions,
+    build: Path,
+    install: Path,
+):
+    """Run CMake build / test / install steps on a configured build tree."""
+    LOG.info("build")
+    build_cmd = ["cmake", "--build", str(build), f"-j{cmeel_config.jobs}"]
+    build_env = cmeel_config.get_build_env(options.source)
+    LOG.debug("build command: %s", build_cmd)
+    compiler_cache = cmeel_config.compiler_cache
+    stats = None
+    if compiler_cache is not None:
+        stats = compiler_cache_stats(compiler_cache, build_env)
+    if report.profile != "off":
+        mark_ninja_log(build)
+    with report.phase("build") as phase:
+        check_call(build_cmd, env=build_env)
+    if phase.enabled:
+        analysis = analyze(build)
+        if analysis is not None:
+            report.sections["ninja"], edges = analysis
+            report.events += ninja_trace_events(edges, phase.start)
+    if compiler_cache is not None:
+        log_compiler_cache_stats(compiler_cache, build_env, stats)
+
+    run_tests, after_install = options.run_tests, options.run_tests_after_install
+    with report.phase("test before install"):
+        launch_tests(True, run_tests and not after_install, pyproject, build)
+
+    LOG.info("install")
+    install_cmd = ["cmake", "--build", str(build), "-t", "install"]
+    LOG.debug("install command: %s", install_cmd)
+    with report.phase("install") as phase:
+        check_call(install_cmd, env=build_env)
+        phase.count(install)
+
+    with report.phase("test after install"):
+        launch_tests(False, run_tests and after_install, pyproject, build)
+
+
+def pgo_train(
+    report: Report,
+    conf,
+    options: BuildOptions,
+    configure_env,
+    prefix: Path,
+    persistent: bool,
+):
+    """Build with instrumentation and run the training command, for PGO.
+
+    Return the configure environment to build with the collected profiles.
+    """
+    pgo = PGO(detect_compiler(configure_env), prefix / "pgo-profiles")
+    LOG.info("PGO with %s", pgo.compiler)
+    build = prefix / "pgo-bld"
+    configure_args = cmeel_config.get_configure_args(
+        conf,
+        prefix / "pgo-install",
+        options.configure_args,
+        configure_env,
+        True,
+    )
+    configure_cmd = ["cmake", "-S", options.source, "-B", str(build), *configure_args]
+    generate_env = add_flags(configure_env, pgo.generate_flags(build))
+    build_cmd = ["cmake", "--build", str(build), f"-j{cmeel_config.jobs}"]
+    training_cmd = [i.replace("BUILD_DIR", str(build)) for i in options.pgo_cmd]
+    LOG.debug("PGO training command: %s", training_cmd)
+
+    phases = []
+    with report.phase("pgo configure") as phase:
+        configure(configure_cmd, generate_env, build, persistent)
+    phases.append(phase)
+    with report.phase("pgo build") as phase:
+        check_call(build_cmd, env=cmeel_config.get_build_env(options.source))
+    phases.append(phase)
+    with report.phase("pgo training") as phase:
+        pgo.reset()
+        check_call(training_cmd, env=cmeel_config.get_test_env())
+    phases.append(phase)
+    with report.phase("pgo merge") as phase:
+        profiles = pgo.merge(configure_env)
+    phases.append(phase)
+    for phase in phases:
+        LOG.info("%s: %.1fs", phase.name, phase.wall)
+    LOG.info("PGO: %d profiles in %s", profiles, pgo.profiles)
+    return add_flags(configure_env, pgo.use_flags(prefix / PGO_USE))
+
+
+def build_isa_variants(
+    report: Report,
+    conf,
+    options: BuildOptions,
+    configure_env,
+    prefix: Path,
+    install: Path,
+    persistent: bool,
+):
+    """Build and install the project again for each x86-64 level of isa-variants.
+
+    Each variant is configured for the same install prefix as the main build, so
+    that later stages handle its paths and RUNPATH the same way, but installed in
+    prefix / "isa" / level.
+    """
+    configure_args = cmeel_config.get_configure_args(
+        conf,
+        install,
+        options.configure_args,
+        configure_env,
+        False,
+    )
+    for level in options.isa_variants:
+        build = prefix / f"bld-{level}"
+        destination = prefix / "isa" / level
+        configure_cmd = [
+            "cmake",
+            *("-S", options.source, "-B", str(build)),
+            *configure_args,
+        ]
+        level_env = add_flags(configure_env, [f"-march={level}"])
+        build_cmd = ["cmake", "--build", str(build), f"-j{cmeel_config.jobs}"]
+        install_cmd = ["cmake", "--install", str(build), "--prefix", str(destination)]
+        LOG.info("build ISA variant %s", level)
+        with report.phase(f"{level} configure"):
+            configure(configure_cmd, level_env, build, persistent)
+        with report.phase(f"{level} build"):
+            check_call(build_cmd, env=cmeel_config.get_build_env(options.source))
+        with report.phase(f"{level} install") as phase:
+            shutil.rmtree(destination, ignore_errors=True)
+            check_call(install_cmd)
+            phase.count(destination)
+
+
+def make_wheel(
+    report: Report,
+    pyproject,
+    conf,
+    options: BuildOptions,
+    prefix: Path,
+    distribution: str,
+    tag: str,
+    wheel_directory,
+    editable: bool = False,
+    metadata_directory=None,
+    build: Optional[Path] = None,
+) -> str:
+    """Add dist-info and scripts to an installed prefix, relocate it, and pack it."""
+    wheel_dir = prefix / "whl"
+    install = (prefix if editable else wheel_dir) / CMEEL_PREFIX
+
+    with report.phase("inventory") as phase:
+        if options.install_manifest:
+            inventory = Inventory.load(install, build or prefix / "bld")
+        else:
+            inventory = Inventory(install, list(scan_tree(install)))
+        phase.files, phase.bytes = len(inventory), inventory.size
+
+    if options.isa_variants and not editable:
+        LOG.info("add ISA variants")
+        with report.phase("isa variants") as phase:
+            phase.files = add_variants(
+                inventory,
+                prefix / "isa",
+                options.isa_variants,
+            )
+
+    with report.phase("create dist-info"):
+        create_dist_info(
+            pyproject,
+            conf,
+            wheel_dir,
+            distribution,
+            tag,
+            options.build_number,
+            metadata_directory,
+        )
+
+    LOG.info("fix relocatablization")
+    with report.phase("fix relocatablization") as phase:
+        relocations = relocate(
+            inventory,
+            prefix,
+            options.check_relocatable,
+            options.fix_pkg_config and not editable,
+            cmeel_config.jobs,
+        )
+        phase.files = len(relocations)
+
+    stripped = []
+    if options.strip and not editable:
+        LOG.info("strip debug info")
+        with report.phase("strip") as phase:
+            debug_dir = None
+            if options.split_debug != "off":
+                debug_dir = debug_wheel_dir(prefix)
+                shutil.rmtree(debug_dir.parents[2], ignore_errors=True)
+            stripped = strip(inventory, debug_dir, cmeel_config.jobs)
+            phase.files = len(stripped)
+
+    if options.fix_rpath and not editable:
+        LOG.info("fix RUNPATH")
+        with report.phase("fix rpath") as phase:
+            lib_dirs = [p / "lib" for p in get_prefixes()]
+            runpaths = fix_rpath(inventory, prefix, lib_dirs, cmeel_config.jobs)
+            phase.files = len(runpaths)
+
+    with report.phase("expose bin"):
+        expose_bin(
+            install,
+            wheel_dir,
+            distribution,
+            inventory.directory("bin"),
+            (install / "lib" / HWCAPS).is_dir(),
+        )
+
+    if not editable:
+        LOG.info("scan for temporary paths")
+        with report.phase("scan relocatability") as phase:
+            findings = scan(
+                inventory,
+                prefix,
+                options.check_relocatable,
+                options.strict_relocatable,
+                cmeel_config.jobs,
+            )
+            phase.files = len(findings)
+
+    if options.deduplicate and not editable:
+        LOG.info("deduplicate files")
+        with report.phase("deduplicate"):
+            dedupe(inventory, distribution, cmeel_config.jobs)
 
     if editable:
         LOG.info("Add .pth in wheel")
-        with (wheel_dir / f"{distribution}.pth").open("w") as f:
-            f.write(str((install / SITELIB).absolute()))
-    elif fix_pkg_config:
-        LOG.info("fix pkg-config files")
-        for fc in install.glob("**/*.pc"):
-            with fc.open() as f:
-                pc_file = f.read()
-            if str(install) in pc_file:
-                rel = str(fc.parent.relative_to(install))
-                fix = "/".join(["${pcfiledir}"] + [".." for _ in rel.split("/")])
-                LOG.warning("fix pkg-config %s: replace %s by %s", fc, install, fix)
-                with fc.open("w") as f:
-                    f.write(pc_file.replace(str(install), fix))
+        write_editable_pth(conf, options, prefix, install, wheel_dir, distribution)
 
     LOG.info("wheel pack")
-    pack = check_output(
-        [
-            sys.executable,
-            "-m",
-            "wheel",
-            "pack",
-            "--build-number",
-            str(build_number),
-            "-d",
+    with report.phase("wheel pack") as phase:
+        phase.files, phase.bytes = len(inventory), inventory.size
+        wheel = pack(
+            wheel_dir,
+            wheel_directory,
+            distribution,
+            tag,
+            options.build_number,
+            cmeel_config.jobs,
+            inventory=None if editable else inventory,
+        )
+
+    if any(s.debug is not None for s in stripped):
+        LOG.info("pack debug files")
+        with report.phase("pack debug files"):
+            pack_debug(
+                conf,
+                options,
+                prefix,
+                install,
+                stripped,
+                distribution,
+                tag,
+                wheel_directory,
+                wheel,
+            )
+    return wheel
+
+
+def write_editable_pth(
+    conf,
+    options: BuildOptions,
+    prefix: Path,
+    install: Path,
+    wheel_dir: Path,
+    distribution: str,
+):
+    """Add the install sitelib to sys.path, and register the rebuild hook if asked."""
+    sitelib = str((install / SITELIB).absolute())
+    lines = [sitelib]
+    if options.editable_rebuild:
+        source, build = str(Path().absolute()), str((prefix / "bld").absolute())
+        write_stamp(source, build)
+        args = ", ".join(repr(arg) for arg in [conf["name"], source, build, sitelib])
+        # a single line, which must not fail without cmeel_editable: eg. if the
+        # installed cmeel is older, or was removed
+        lines.append(
+            "import importlib.util; "
+            'importlib.util.find_spec("cmeel_editable") and '
+            f'__import__("cmeel_editable").register({args})',
+        )
+    with (wheel_dir / f"{distribution}.pth").open("w") as f:
+        f.write("\n".join(lines))
+
+
+def pack_debug(
+    conf,
+    options: BuildOptions,
+    prefix: Path,
+    install: Path,
+    stripped: List[Stripped],
+    distribution: str,
+    tag: str,
+    wheel_directory,
+    wheel: str,
+):
+    """Pack debug files split from the wheel, in a tarball or a -debug wheel."""
+    if options.split_debug == "tarball":
+        debug_tarball(install, stripped, wheel_directory, wheel)
+    else:
+        debug_wheel(
+            prefix,
+            conf,
+            distribution,
+            tag,
+            options.build_number,
+            wheel_directory,
+            cmeel_config.jobs,
+        )
+
+
+def set_test_path(options: BuildOptions, install: Path, sitelib: str = SITELIB):
+    """Prepend the installed python modules to PYTHONPATH, for tests after install."""
+    if options.run_tests_after_install:
+        path = f"{install / sitelib}"
+        old = os.environ.get("PYTHONPATH", "")
+        if old:
+            path += f"{os.pathsep}{old}"
+        os.environ.update(PYTHONPATH=path)
+
+
+def build_impl(wheel_directory, editable=False, metadata_directory=None) -> str:
+    """Run CMake configure / build / test / install steps, and pack the wheel."""
+    logging.basicConfig(level=cmeel_config.log_level.upper())
+    LOG.info("CMake Wheel in editable mode" if editable else "CMake Wheel")
+    LOG.info("cmeel version %s", __version__)
+    log_pip()
+
+    pyproject, conf, distribution = load_pyproject()
+    tag = get_tag(pyproject)
+
+    persistent = cmeel_config.persistent_build and not editable
+    if editable:
+        prefix = Path() / "build-editable"
+    elif persistent:
+        prefix = build_prefix(conf["name"], tag)
+    else:
+        prefix = cmeel_config.temp_dir
+    build = prefix / "bld"
+    wheel_dir = prefix / "whl"
+    install = (prefix if editable else wheel_dir) / CMEEL_PREFIX
+
+    # kept build trees are used by one build at a time
+    with lock_prefix(prefix) if persistent or editable else nullcontext():
+        if persistent and wheel_dir.exists():
+            LOG.info("clean previous wheel directory in %s", prefix)
+            shutil.rmtree(wheel_dir)
+
+        options = BuildOptions(pyproject)
+
+        LOG.info("build wheel")
+        report = Report(cmeel_config.profile)
+
+        # Patch
+
+        with report.phase("patch"):
+            patch()
+
+        # Set env
+
+        set_test_path(options, install)
+
+        # Configure
+
+        LOG.info("configure")
+        configure_env = cmeel_config.get_configure_env(options.source)
+        configure_args = cmeel_config.get_configure_args(
+            conf,
+            install,
+            options.configure_args,
+            configure_env,
+            options.run_tests,
+        )
+        key = None
+        if cmeel_config.cache and not editable:
+            LOG.info("look for a cached wheel")
+            with report.phase("cache lookup"):
+                key = cache_key(
+                    configure_args,
+                    configure_env,
+                    tag,
+                    options.build_number,
+                    install,
+                    pyproject.get("build-system", {}).get("requires", []),
+                )
+                name = get_wheel(key, wheel_directory)
+            if name is not None:
+                report.write(wheel_directory, name)
+                LOG.debug("returning '%s'", name)
+                return name
+
+        if options.pgo and not editable:
+            configure_env = pgo_train(
+                report, conf, options, configure_env, prefix, persistent
+            )
+            # flags come from the environment only in a new tree, and objects must
+            # be rebuilt with the new profiles anyway: keep bld for other builds
+            build = prefix / PGO_USE
+            shutil.rmtree(build, ignore_errors=True)
+
+        configure_cmd = [
+            "cmake",
+            "-S",
+            options.source,
+            "-B",
+            str(build),
+            *configure_args,
+        ]
+        LOG.debug("configure environment: %s", configure_env)
+        LOG.debug("configure command: %s", configure_cmd)
+        with report.phase("configure"):
+            configure(configure_cmd, configure_env, build, persistent)
+
+        build_and_install(report, pyproject, options, build, install)
+
+        if options.isa_variants and not editable:
+            build_isa_variants(
+                report, conf, options, configure_env, prefix, install, persistent
+            )
+
+        name = make_wheel(
+            report,
+            pyproject,
+            conf,
+            options,
+            prefix,
+            distribution,
+            tag,
             wheel_directory,
-            str(wheel_dir),
-        ],
-    ).decode()
-    LOG.debug("wheel pack output: %s", pack)
-    parse_pack = re.search("Repacking wheel as (.*\\.whl)\\.\\.\\.", pack)
-    if parse_pack is None:
-        err = (
-            "'wheel pack' command did not provide the .whl name, "
-            "or the parser must be updated. Please report the following output: \n"
-        )
-        raise FileNotFoundError(err + pack)
-    name = Path(parse_pack.group(1)).name
-    LOG.debug("returning '%s'", name)
-
-    LOG.info("done")
-    return name
+            editable,
+            metadata_directory,
+            build,
+        )
+        if key is not None:
+            with report.phase("cache store"):
+                put_wheel(key, Path(wheel_directory) / name)
+
+        report.write(wheel_directory, name)
+        LOG.debug("returning '%s'", name)
+
+        LOG.info("done")
+        return name
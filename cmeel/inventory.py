@@ -0,0 +1,178 @@
+"""Inventory of the files of an install prefix.
+
+It is built once after the install step, from CMake's ``install_manifest.txt``, or
+from a single walk of the install prefix if that manifest is missing or stale. The
+following stages then use it instead of walking the tree again, and update it when
+they change files.
+"""
+
+import hashlib
+import logging
+import os
+import stat
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .elf import is_elf
+
+LOG = logging.getLogger("cmeel.inventory")
+
+CHUNK_SIZE = 1 << 20
+MANIFEST = "install_manifest.txt"
+
+
+class Entry:
+    """A file or symlink of the install prefix, with its hash computed lazily."""
+
+    __slots__ = ("_head", "_sha256", "inode", "mode", "path", "size")
+
+    def __init__(self, path: Path, st: os.stat_result) -> None:
+        """Record the lstat of path."""
+        self.path = path
+        self.size = st.st_size
+        self.mode = st.st_mode
+        self.inode = (st.st_dev, st.st_ino)
+        self._head: Optional[bytes] = None
+        self._sha256: Optional[str] = None
+
+    @property
+    def is_link(self) -> bool:
+        """Check if this is a symlink."""
+        return stat.S_ISLNK(self.mode)
+
+    @property
+    def is_elf(self) -> bool:
+        """Check if this is a regular ELF file."""
+        if self.is_link or self.size < 4:
+            return False
+        if self._head is None:
+            with self.path.open("rb") as f:
+                self._head = f.read(4)
+        return is_elf(self._head)
+
+    @property
+    def sha256(self) -> str:
+        """Get the hash of the content, computed on first use."""
+        if self._sha256 is None:
+            sha256 = hashlib.sha256()
+            with self.path.open("rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+            self._sha256 = sha256.hexdigest()
+        return self._sha256
+
+
+def walk_key(path: Path) -> Tuple[Tuple[str, ...], str]:
+    """Sort paths like a sorted os.walk: files of a directory before subdirectories."""
+    return path.parent.parts, path.name
+
+
+class Inventory:
+    """Files and symlinks of an install prefix."""
+
+    def __init__(self, root: Path, paths: List[Path]) -> None:
+        """Record paths of the install prefix at root."""
+        self.root = root
+        self.entries: Dict[Path, Entry] = {}
+        for path in paths:
+            self.update(path)
+
+    @classmethod
+    def load(cls, root: Path, build: Path) -> "Inventory":
+        """Read the install manifest of a build tree, or walk root without it."""
+        start = time.perf_counter()
+        inventory = cls.from_manifest(root, build / MANIFEST)
+        if inventory is None:
+            inventory = cls(root, list(scan_tree(root)))
+        LOG.info(
+            "inventory of %d files, %d bytes in %.3fs",
+            len(inventory.entries),
+            inventory.size,
+            time.perf_counter() - start,
+        )
+        return inventory
+
+    @classmethod
+    def from_manifest(cls, root: Path, manifest: Path) -> Optional["Inventory"]:
+        """Read an install manifest, if it exists and lists the current files of root."""
+        if not manifest.exists():
+            LOG.debug("no %s", manifest)
+            return None
+        paths = [Path(line) for line in manifest.read_text().splitlines() if line]
+        base = root.absolute()
+        outside = [p for p in paths if base not in p.parents]
+        if not paths or outside:
+            LOG.debug("%s does not match %s: %s", manifest, root, outside[:1])
+            return None
+        try:
+            inventory = cls(root, [root / p.relative_to(base) for p in paths])
+        except FileNotFoundError as e:
+            LOG.debug("%s is outdated: %s", manifest, e)
+            return None
+        changed = inventory.changed_since(manifest.stat().st_mtime_ns)
+        if changed is not None:
+            LOG.debug("%s is outdated: %s changed after it", manifest, changed)
+            return None
+        return inventory
+
+    def changed_since(self, mtime_ns: int) -> Optional[Path]:
+        """Get a directory holding entries which got files added or removed after."""
+        directories = {self.root}
+        for path in self.entries:
+            parent = path.parent
+            while parent not in directories:
+                directories.add(parent)
+                parent = parent.parent
+        for directory in sorted(directories):
+            if directory.stat().st_mtime_ns > mtime_ns:
+                return directory
+        return None
+
+    def update(self, path: Path) -> None:
+        """Add or refresh path, after it was created or changed, or remove it if gone."""
+        try:
+            self.entries[path] = Entry(path, path.lstat())
+        except FileNotFoundError:
+            if path not in self.entries:
+                raise
+            del self.entries[path]
+
+    def __iter__(self) -> Iterator[Entry]:
+        """Iterate on entries, in the order of a sorted walk."""
+        return iter(sorted(self.entries.values(), key=lambda e: walk_key(e.path)))
+
+    def __len__(self) -> int:
+        """Get the number of files and symlinks."""
+        return len(self.entries)
+
+    @property
+    def size(self) -> int:
+        """Get the total size of files and symlinks."""
+        return sum(entry.size for entry in self.entries.values())
+
+    def paths(self) -> List[Path]:
+        """List paths of files and symlinks, in the order of a sorted walk."""
+        return [entry.path for entry in self]
+
+    def elf_files(self) -> List[Path]:
+        """List regular ELF files."""
+        return [entry.path for entry in self if entry.is_elf]
+
+    def directory(self, name: str) -> List[Path]:
+        """List files and symlinks directly in a directory of the install prefix."""
+        directory = self.root / name
+        return [entry.path for entry in self if entry.path.parent == directory]
+
+
+def scan_tree(root: Path) -> Iterator[Path]:
+    """Walk a tree once with os.scandir, without following symlinks to directories."""
+    if not root.is_dir():
+        return
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from scan_tree(Path(entry.path))
+        else:
+            yield Path(entry.path)
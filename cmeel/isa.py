@@ -0,0 +1,160 @@
+"""Variants of shared libraries for x86-64 micro-architecture levels.
+
+The project is built again for each level of ``isa-variants``, eg. ``x86-64-v3``,
+in its own build tree, and the shared libraries of those builds are packed in
+``cmeel.prefix/lib/glibc-hwcaps/<level>``. There, glibc >= 2.33 loads the best one
+supported by the CPU. With an older glibc, or if the ``CMEEL_ISA`` environment
+variable selects a level, ``cmeel.pth`` and exposed executables use the best level
+found in ``/proc/cpuinfo``, or the selected one.
+"""
+
+import logging
+import os
+import platform
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from .elf import ET_DYN, ELFError, open_elf
+from .inventory import Inventory, scan_tree
+
+LOG = logging.getLogger("cmeel.isa")
+
+BASELINE = "x86-64"
+HWCAPS = "glibc-hwcaps"
+# vvv Warning: keep sync with cmeel_pth.py
+# SONAMEs of the variants in glibc-hwcaps, each one after those it needs
+PRELOAD = "cmeel-preload.txt"
+# CPU flags required by each level, in addition to those of the previous levels
+LEVELS = {
+    "x86-64-v2": ["cx16", "lahf_lm", "popcnt", "sse4_1", "sse4_2", "ssse3"],
+    "x86-64-v3": ["abm", "avx", "avx2", "bmi1", "bmi2", "f16c", "fma", "movbe"],
+    "x86-64-v4": ["avx512bw", "avx512cd", "avx512dq", "avx512f", "avx512vl"],
+}
+# ^^^
+
+
+def check_levels(levels: List[str]) -> List[str]:
+    """Check that levels are known, and that they can be built on this machine."""
+    unknown = [level for level in levels if level not in LEVELS]
+    if unknown:
+        err = f"isa-variants must be among {list(LEVELS)}, not {unknown}"
+        raise ValueError(err)
+    if levels and (
+        sys.platform != "linux" or platform.machine().lower() not in ("x86_64", "amd64")
+    ):
+        LOG.warning("isa-variants are only built for x86_64 Linux: skip them")
+        return []
+    return levels
+
+
+def cpu_flags(cpuinfo: str = "/proc/cpuinfo") -> Set[str]:
+    """Get the flags of the first CPU."""
+    try:
+        with open(cpuinfo) as f:  # noqa: PTH123
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def best_level(flags: Set[str]) -> str:
+    """Get the highest level whose flags, and those of lower levels, are all present."""
+    ret = BASELINE
+    for level, required in LEVELS.items():
+        if not flags.issuperset(required):
+            break
+        ret = level
+    return ret
+
+
+def selected_level(env: Optional[Dict[str, str]] = None) -> str:
+    """Get the level selected by CMEEL_ISA, or the best one for this CPU."""
+    if env is None:
+        env = dict(os.environ)
+    return env.get("CMEEL_ISA") or best_level(cpu_flags())
+
+
+def glibc_selects_hwcaps() -> bool:
+    """Check if the dynamic loader selects glibc-hwcaps subdirectories by itself."""
+    try:
+        libc = os.confstr("CS_GNU_LIBC_VERSION") or ""
+    except (ValueError, OSError):
+        return False
+    if not libc.startswith("glibc "):
+        return False
+    version = tuple(int(i) for i in libc.split()[1].split(".")[:2])
+    return version >= (2, 33)
+
+
+def variant_dir(lib: Path, env: Optional[Dict[str, str]] = None) -> Optional[Path]:
+    """Get the variant directory to use explicitly, if the loader won't choose it."""
+    if env is None:
+        env = dict(os.environ)
+    if glibc_selects_hwcaps() and not env.get("CMEEL_ISA"):
+        return None
+    directory = lib / HWCAPS / selected_level(env)
+    return directory if directory.is_dir() else None
+
+
+def shared_libraries(install: Path) -> List[Path]:
+    """List regular shared libraries with a SONAME in the lib directory of a prefix."""
+    ret = []
+    for path in scan_tree(install / "lib"):
+        if path.parent != install / "lib" or path.is_symlink():
+            continue
+        try:
+            with open_elf(path) as elf:
+                if elf.type == ET_DYN and elf.soname is not None:
+                    ret.append(path)
+        except (ELFError, ValueError):
+            # ValueError from mmap for empty files
+            continue
+    return ret
+
+
+def add_variants(inventory: Inventory, variants: Path, levels: List[str]) -> int:
+    """Copy shared libraries of installed variants in glibc-hwcaps directories."""
+    count = 0
+    needed: Dict[str, List[str]] = {}
+    for level in levels:
+        destination = inventory.root / "lib" / HWCAPS / level
+        destination.mkdir(parents=True, exist_ok=True)
+        libraries = shared_libraries(variants / level)
+        for library in libraries:
+            with open_elf(library) as elf:
+                soname = elf.soname
+                assert soname is not None
+                needed[soname] = elf.needed
+            target = destination / soname
+            shutil.copy2(library, target)
+            inventory.update(target)
+        LOG.info("%s: %d shared libraries", level, len(libraries))
+        count += len(libraries)
+    if needed:
+        preload = inventory.root / "lib" / HWCAPS / PRELOAD
+        preload.write_text("".join(f"{soname}\n" for soname in load_order(needed)))
+        inventory.update(preload)
+    return count
+
+
+def load_order(needed: Dict[str, List[str]]) -> List[str]:
+    """Sort SONAMEs so that each library comes after the libraries it needs."""
+    ret: List[str] = []
+    seen: Set[str] = set()
+
+    def visit(soname: str):
+        if soname in seen:
+            return
+        seen.add(soname)
+        for dep in needed[soname]:
+            if dep in needed:
+                visit(dep)
+        ret.append(soname)
+
+    for soname in sorted(needed):
+        visit(soname)
+    return ret
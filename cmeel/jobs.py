@@ -0,0 +1,117 @@
+"""Choose the number of parallel jobs from the resources available.
+
+CPU quotas and memory limits of cgroups v1 and v2 are taken into account, so that
+builds in containers do not oversubscribe the host. The cgroup of this process is
+read from ``/proc/self/cgroup``, and the limits of its ancestors also apply.
+"""
+
+import logging
+import math
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+LOG = logging.getLogger("cmeel.jobs")
+
+CGROUP = Path("/sys/fs/cgroup")
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def cgroup_dirs(
+    controller: str = "",
+    proc_cgroup: Path = Path("/proc/self/cgroup"),
+) -> List[Path]:
+    """Get the cgroup directories of this process and of its ancestors.
+
+    Those are for a cgroup v1 controller if given, or for cgroup v2.
+    """
+    root = CGROUP / controller if controller else CGROUP
+    path = "/"
+    for line in (_read(proc_cgroup) or "").split("\n"):
+        # "0::/path" for cgroup v2, "N:controllers:/path" for v1
+        fields = line.split(":", 2)
+        if len(fields) == 3 and controller in fields[1].split(","):
+            path = fields[2]
+    directory = root / path.lstrip("/")
+    return [directory, *(p for p in directory.parents if root in (p, *p.parents))]
+
+
+def cgroup_cpus() -> Optional[float]:
+    """Get the CPU quota of the current cgroup and its ancestors, if any."""
+    quotas = []
+    for directory in cgroup_dirs():
+        # cgroup v2: "$MAX $PERIOD", with "max" for unlimited
+        cpu_max = _read(directory / "cpu.max")
+        if cpu_max:
+            quota, _, period = cpu_max.partition(" ")
+            if quota != "max" and period:
+                quotas.append(int(quota) / int(period))
+    for directory in cgroup_dirs("cpu"):
+        # cgroup v1: -1 for unlimited
+        cfs_quota = _read(directory / "cpu.cfs_quota_us")
+        cfs_period = _read(directory / "cpu.cfs_period_us")
+        if cfs_quota and cfs_period and int(cfs_quota) > 0:
+            quotas.append(int(cfs_quota) / int(cfs_period))
+    return min(quotas) if quotas else None
+
+
+def available_cpus() -> int:
+    """Get the number of CPUs this process can use."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpus()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def available_memory() -> Optional[int]:
+    """Get the memory available to this process in bytes, if it can be found."""
+    available = None
+    meminfo = _read(Path("/proc/meminfo"))
+    if meminfo:
+        for line in meminfo.split("\n"):
+            if line.startswith("MemAvailable:"):
+                available = int(line.split()[1]) * 1024
+    elif hasattr(os, "sysconf") and "SC_PHYS_PAGES" in os.sysconf_names:
+        available = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+    limits = [(d / "memory.max", d / "memory.current") for d in cgroup_dirs()]
+    limits += [
+        (d / "memory.limit_in_bytes", d / "memory.usage_in_bytes")
+        for d in cgroup_dirs("memory")
+    ]
+    for limit_file, usage_file in limits:
+        limit, usage = _read(limit_file), _read(usage_file)
+        if limit and usage and limit.isdigit():
+            cgroup_available = max(0, int(limit) - int(usage))
+            if available is None or cgroup_available < available:
+                available = cgroup_available
+    return available
+
+
+def auto_jobs(link_memory: int) -> Tuple[int, int, int]:
+    """Get numbers of compile, link and test jobs.
+
+    The number of link jobs is capped so that each one can use link_memory bytes.
+    """
+    cpus = available_cpus()
+    memory = available_memory()
+    link = cpus if memory is None else max(1, min(cpus, memory // link_memory))
+    LOG.info(
+        "auto jobs: %s cpus and %s bytes available: %s compile, %s link, %s test",
+        cpus,
+        memory,
+        cpus,
+        link,
+        cpus,
+    )
+    return cpus, link, cpus
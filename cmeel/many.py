@@ -0,0 +1,297 @@
+"""Build many local projects, in the order of their dependencies.
+
+Dependencies between projects are read from ``project.dependencies`` and
+``build-system.requires`` of their ``pyproject.toml``. Projects whose dependencies
+are built run concurrently, within a global CPU budget, and each wheel built is
+unpacked in a staging prefix, which is in the ``PYTHONPATH`` and
+``CMAKE_PREFIX_PATH`` of the following builds. Dependents of a failed project are
+skipped, but other projects are still built.
+"""
+
+import logging
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from subprocess import PIPE, STDOUT, Popen
+from threading import Lock
+from typing import Dict, List, Optional, Set
+
+try:
+    import tomllib  # type: ignore
+except ModuleNotFoundError:
+    import tomli as tomllib  # type: ignore
+
+from .cache import REQUIREMENT
+from .consts import CMEEL_PREFIX, SITELIB
+from .dedupe import restore_links
+from .jobs import available_cpus
+from .utils import normalize
+
+LOG = logging.getLogger("cmeel.many")
+
+# pip wheel output for each wheel built
+CREATED = re.compile(r"Created wheel for \S+: filename=(\S+\.whl)")
+
+
+def add_build_many_arguments(subparsers):
+    """Append build-many command for argparse."""
+    sub = subparsers.add_parser(
+        "build-many",
+        help="build wheels of local projects, in the order of their dependencies.",
+    )
+    sub.add_argument("projects", nargs="+", help="directories of the projects")
+    sub.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="CPUs shared by all builds. Default to the available CPUs.",
+    )
+    sub.add_argument(
+        "-w",
+        "--wheel-dir",
+        default="wh",
+        help="directory where wheels are written. Default to 'wh'.",
+    )
+    sub.add_argument(
+        "-s",
+        "--staging",
+        default="staging",
+        help="prefix where wheels are unpacked for dependents. Default to 'staging'.",
+    )
+    sub.set_defaults(cmd="build-many")
+
+
+class Project:
+    """A local project, its dependencies among other projects, and its build."""
+
+    def __init__(self, path: Path) -> None:
+        """Read the name and requirements of a project."""
+        self.path = path
+        with (path / "pyproject.toml").open("rb") as f:
+            pyproject = tomllib.load(f)
+        self.name = normalize(pyproject["project"]["name"])
+        requirements = [
+            *pyproject["project"].get("dependencies", []),
+            *pyproject.get("build-system", {}).get("requires", []),
+        ]
+        self.requires: Set[str] = set()
+        for requirement in requirements:
+            match = REQUIREMENT.match(requirement)
+            if match:
+                self.requires.add(normalize(match.group(1)))
+        self.deps: List[Project] = []
+        self.status = "pending"
+        self.jobs = 0
+        self.duration = 0.0
+        self.wheel: Optional[Path] = None
+
+    def run(self, cmd: List[str], env: Dict[str, str], wheels: Path, lock: Lock):
+        """Build the wheel, and print output lines prefixed with the project name."""
+        LOG.info("running '%s' with %d jobs", cmd, self.jobs)
+        start = time.perf_counter()
+        with Popen(
+            cmd,
+            cwd=self.path,
+            env=env,
+            stdout=PIPE,
+            stderr=STDOUT,
+            text=True,
+            errors="replace",
+        ) as proc:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                created = CREATED.search(line)
+                if created:
+                    self.wheel = wheels / created.group(1)
+                with lock:
+                    sys.stdout.write(f"[{self.name}] {line}")
+                    sys.stdout.flush()
+        self.duration = time.perf_counter() - start
+        ok = proc.returncode == 0 and self.wheel is not None
+        self.status = "ok" if ok else f"failed ({proc.returncode})"
+
+    def install(self, staging: Path):
+        """Unpack the wheel built in the staging prefix, or fail this project."""
+        assert self.wheel is not None
+        try:
+            install_wheel(self.wheel, staging)
+        except (OSError, zipfile.BadZipFile) as e:
+            # only its dependents are then skipped
+            LOG.error("%s: can't install %s: %s", self.name, self.wheel, e)
+            self.status = "failed (install)"
+
+
+def load_projects(paths: List[str]) -> List[Project]:
+    """Read projects, and link them to the other projects they require."""
+    projects = [Project(Path(path).absolute()) for path in paths]
+    by_name = {p.name: p for p in projects}
+    for project in projects:
+        project.deps = [by_name[r] for r in sorted(project.requires) if r in by_name]
+    check_cycles(projects)
+    return projects
+
+
+def check_cycles(projects: List[Project]):
+    """Raise if some projects depend on each other."""
+    done: Set[str] = set()
+
+    def visit(project: Project, path: List[str]):
+        if project.name in path:
+            cycle = " -> ".join([*path[path.index(project.name) :], project.name])
+            err = f"dependency cycle: {cycle}"
+            raise ValueError(err)
+        if project.name not in done:
+            for dep in project.deps:
+                visit(dep, [*path, project.name])
+            done.add(project.name)
+
+    for project in projects:
+        visit(project, [])
+
+
+def priorities(projects: List[Project]) -> Dict[str, int]:
+    """Rank projects by the length of the longest chain of their dependents."""
+    ret: Dict[str, int] = {}
+
+    def visit(project: Project) -> int:
+        if project.name not in ret:
+            dependents = [p for p in projects if project in p.deps]
+            ret[project.name] = 1 + max((visit(p) for p in dependents), default=0)
+        return ret[project.name]
+
+    for project in projects:
+        visit(project)
+    return ret
+
+
+def staging_env(staging: Path, jobs: int, name: str) -> Dict[str, str]:
+    """Get the environment of a build, using the staging prefix and a share of CPUs."""
+    env = os.environ.copy()
+    prefix = staging / CMEEL_PREFIX
+    pythonpath = os.pathsep.join([str(prefix / SITELIB), str(staging)])
+    cmake_prefix_path = str(prefix)
+    for var, value in [
+        ("PYTHONPATH", pythonpath),
+        ("CMAKE_PREFIX_PATH", cmake_prefix_path),
+    ]:
+        env[var] = os.pathsep.join([value, env.get(var, "")]).strip(os.pathsep)
+    env["CMEEL_JOBS"] = env["CMEEL_TEST_JOBS"] = str(jobs)
+    if "CMEEL_TEMP_DIR" in env:
+        # concurrent builds must not share a temporary directory
+        env["CMEEL_TEMP_DIR"] = str(Path(env["CMEEL_TEMP_DIR"]) / name)
+    return env
+
+
+def install_wheel(wheel: Path, staging: Path):
+    """Unpack a wheel in the staging prefix, keeping file modes, and restore links."""
+    with zipfile.ZipFile(wheel) as zf:
+        for info in zf.infolist():
+            path = Path(zf.extract(info, staging))
+            mode = info.external_attr >> 16
+            if mode & 0o777:
+                path.chmod(mode & 0o777)
+    restore_links(staging / CMEEL_PREFIX)
+
+
+def critical_path(projects: List[Project]) -> List[Project]:
+    """Get the chain of dependencies which took the longest to build."""
+    cache: Dict[str, List[Project]] = {}
+
+    def visit(project: Project) -> List[Project]:
+        if project.name not in cache:
+            chains = [visit(dep) for dep in project.deps]
+            longest = max(chains, key=lambda c: sum(p.duration for p in c), default=[])
+            cache[project.name] = [*longest, project]
+        return cache[project.name]
+
+    chains = [visit(project) for project in projects]
+    return max(chains, key=lambda c: sum(p.duration for p in c), default=[])
+
+
+def summary(projects: List[Project], wall: float) -> str:
+    """Show a table of the builds, and their critical path."""
+    rows = [["project", "status", "jobs", "duration", "wheel"]]
+    for p in projects:
+        wheel = "" if p.wheel is None else p.wheel.name
+        rows.append([p.name, p.status, str(p.jobs), f"{p.duration:.1f}s", wheel])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+    lines = [
+        "  ".join([*(cell.ljust(w) for cell, w in zip(row, widths)), row[-1]])
+        for row in rows
+    ]
+    chain = critical_path(projects)
+    names = " -> ".join(p.name for p in chain)
+    total = sum(p.duration for p in projects)
+    lines += [
+        f"critical path: {names} ({sum(p.duration for p in chain):.1f}s)",
+        f"wall time: {wall:.1f}s, sum of build times: {total:.1f}s",
+    ]
+    return "\n".join(lines)
+
+
+def build_many(
+    projects: List[str],
+    wheel_dir: str,
+    staging: str,
+    jobs: Optional[int] = None,
+    **kwargs,
+) -> List[Project]:
+    """Build wheels of projects concurrently, after the projects they require."""
+    todo = load_projects(projects)
+    rank = priorities(todo)
+    budget = jobs or available_cpus()
+    wheels = Path(wheel_dir).absolute()
+    prefix = Path(staging).absolute()
+    prefix.mkdir(parents=True, exist_ok=True)
+    cmd = [sys.executable, "-m", "pip", "wheel", "--no-deps", "--no-build-isolation"]
+    cmd = [*cmd, "-w", str(wheels), "."]
+    LOG.info("%d projects, with %d CPUs", len(todo), budget)
+
+    lock = Lock()
+    free = budget
+    pending = sorted(todo, key=lambda p: -rank[p.name])
+    running: Dict[Future, Project] = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(budget, len(todo)))) as pool:
+        while pending or running:
+            for project in pending.copy():
+                if any(
+                    dep.status not in ("pending", "running", "ok")
+                    for dep in project.deps
+                ):
+                    project.status = "skipped"
+                    pending.remove(project)
+            ready = [p for p in pending if all(d.status == "ok" for d in p.deps)]
+            ready = ready[:free]
+            for i, project in enumerate(ready):
+                # split free CPUs among ready projects, the longest chains first
+                project.jobs = free // (len(ready) - i)
+                project.status = "running"
+                free -= project.jobs
+                pending.remove(project)
+                env = staging_env(prefix, project.jobs, project.name)
+                running[pool.submit(project.run, cmd, env, wheels, lock)] = project
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                project = running.pop(future)
+                free += project.jobs
+                try:
+                    future.result()
+                except OSError as e:
+                    LOG.error("%s: %s", project.name, e)
+                    project.status = "failed"
+                if project.status == "ok":
+                    project.install(prefix)
+
+    print(summary(todo, time.perf_counter() - start))
+    failed = [p.name for p in todo if p.status != "ok"]
+    if failed:
+        err = f"{len(failed)} projects failed or were skipped: {', '.join(failed)}"
+        raise RuntimeError(err)
+    return todo
@@ -0,0 +1,184 @@
+"""Build wheels for multiple python interpreters, reusing the same build tree.
+
+The project is configured once per interpreter in the same build tree: as only the
+Python bindings depend on the interpreter, CMake generators only rebuild those, and
+the core libraries are compiled once.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+from contextlib import nullcontext
+from pathlib import Path
+from subprocess import check_output
+from typing import Dict, List
+
+from .consts import CMEEL_PREFIX
+
+LOG = logging.getLogger("cmeel.matrix")
+
+# Build modules are imported in matrix(), to keep other cmeel helpers fast.
+
+PROBE = (
+    "import json, sys, sysconfig; print(json.dumps({"
+    "'executable': sys.executable, "
+    "'implementation': sys.implementation.name, "
+    "'version': sys.version_info[:2], "
+    "'abiflags': getattr(sys, 'abiflags', ''), "
+    "'gil_disabled': bool(sysconfig.get_config_var('Py_GIL_DISABLED'))}))"
+)
+
+# Cache entries found by FindPython, FindPython3, FindPythonInterp / FindPythonLibs,
+# which must be found again for another interpreter
+PYTHON_CACHE = ["Python_*", "Python3_*", "_Python*", "PYTHON_*"]
+
+
+class Interpreter:
+    """A python interpreter, which may not be the current one."""
+
+    def __init__(self, python: str) -> None:
+        """Query an interpreter, from its path or its version, eg. "3.13"."""
+        if re.fullmatch(r"\d+\.\d+t?", python):
+            python = f"python{python}"
+        info = json.loads(check_output([python, "-c", PROBE], text=True))
+        if info["implementation"] != "cpython":
+            err = f"{python} is {info['implementation']}: only CPython is supported"
+            raise ValueError(err)
+        self.executable = info["executable"]
+        major, minor = info["version"]
+        abiflags = info["abiflags"] or ("t" if info["gil_disabled"] else "")
+        self.tag = f"cp{major}{minor}-cp{major}{minor}{abiflags}"
+        # vvv Warning: keep sync with consts.SITELIB
+        self.sitelib = os.path.join(  # noqa: PTH118
+            "lib",
+            f"python{major}.{minor}",
+            "site-packages",
+        )
+
+    def __str__(self) -> str:
+        """Render this interpreter as its tags."""
+        return self.tag
+
+
+def add_matrix_arguments(subparsers):
+    """Append matrix command for argparse."""
+    sub = subparsers.add_parser(
+        "matrix",
+        help="build wheels of the current project for multiple interpreters.",
+    )
+    sub.add_argument(
+        "-p",
+        "--python",
+        nargs="+",
+        required=True,
+        help="python interpreters, as paths or versions, eg. '3.9 3.13 3.13t'",
+    )
+    sub.add_argument(
+        "-w",
+        "--wheel-dir",
+        default="wh",
+        help="directory where wheels are written. Default to 'wh'.",
+    )
+    sub.set_defaults(cmd="matrix")
+
+
+def matrix(python: List[str], wheel_dir: str, **kwargs) -> List[str]:
+    """Build wheels of the current project for multiple interpreters."""
+    from .cache import build_prefix, lock_prefix
+    from .cmeel import __version__
+    from .config import cmeel_config
+    from .impl import (
+        BuildOptions,
+        build_and_install,
+        configure,
+        load_pyproject,
+        make_wheel,
+        set_test_path,
+    )
+    from .report import Report
+    from .utils import get_tag, log_pip, patch
+
+    logging.basicConfig(level=cmeel_config.log_level.upper())
+    LOG.info("cmeel version %s", __version__)
+    log_pip()
+    pyproject, conf, distribution = load_pyproject()
+    options = BuildOptions(pyproject)
+    interpreters: Dict[str, Interpreter] = {}
+    for p in python:
+        interpreter = Interpreter(p)
+        tag = get_tag(pyproject, interpreter.tag)
+        if tag in interpreters:
+            # eg. without sitelib, the wheel does not depend on the interpreter
+            LOG.warning("%s wheel is built once, for %s", tag, interpreters[tag])
+        else:
+            interpreters[tag] = interpreter
+
+    if cmeel_config.persistent_build:
+        prefix = build_prefix(conf["name"], "matrix")
+    else:
+        prefix = cmeel_config.temp_dir
+    build = prefix / "bld"
+    install = prefix / "whl" / CMEEL_PREFIX
+    Path(wheel_dir).mkdir(parents=True, exist_ok=True)
+
+    # tests after install of each interpreter must only find its own modules
+    pythonpath = {k: v for k, v in os.environ.items() if k == "PYTHONPATH"}
+
+    # kept build trees are used by one build at a time
+    with lock_prefix(prefix) if cmeel_config.persistent_build else nullcontext():
+        patch()
+        configure_env = cmeel_config.get_configure_env(options.source)
+
+        names = []
+        for tag, interpreter in interpreters.items():
+            LOG.info("build wheel for %s", interpreter)
+            report = Report(cmeel_config.profile)
+            # the install tree is packed as is: remove modules of previous interpreters
+            shutil.rmtree(prefix / "whl", ignore_errors=True)
+            os.environ.pop("PYTHONPATH", None)
+            os.environ.update(pythonpath)
+            set_test_path(options, install, interpreter.sitelib)
+
+            configure_args = cmeel_config.get_configure_args(
+                conf,
+                install,
+                options.configure_args,
+                configure_env,
+                options.run_tests,
+                interpreter.executable,
+                interpreter.sitelib,
+            )
+            unset = [arg for pattern in PYTHON_CACHE for arg in ("-U", pattern)]
+            configure_cmd = [
+                "cmake",
+                "-S",
+                options.source,
+                "-B",
+                str(build),
+                *unset,
+                *configure_args,
+            ]
+            LOG.debug("configure command: %s", configure_cmd)
+            with report.phase("configure"):
+                configure(configure_cmd, configure_env, build, persistent=True)
+
+            build_and_install(report, pyproject, options, build, install)
+            name = make_wheel(
+                report,
+                pyproject,
+                conf,
+                options,
+                prefix,
+                distribution,
+                tag,
+                wheel_dir,
+            )
+            report.write(wheel_dir, name)
+            print(Path(wheel_dir) / name)
+            names.append(name)
+
+    os.environ.pop("PYTHONPATH", None)
+    os.environ.update(pythonpath)
+    return names
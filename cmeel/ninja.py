@@ -0,0 +1,256 @@
+"""Analyze the Ninja log of a build tree.
+
+The durations of the edges built by the last Ninja run are read from
+``.ninja_log``, and their dependencies from ``build.ninja``, to find the slowest
+compile and link steps, the critical path, and the parallelism achieved. A marker
+is appended to ``.ninja_log`` before the build, as Ninja does not write one for each
+of its runs.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+LOG = logging.getLogger("cmeel.ninja")
+
+TOP = 10
+OBJECTS = (".o", ".obj")
+LIBRARIES = (".so", ".a", ".dylib", ".dll", ".lib", ".exe")
+# comment lines are skipped by ninja when it reads its log
+MARKER = "# cmeel build"
+
+
+class Edge:
+    """A Ninja edge run during the last build."""
+
+    def __init__(self, output: str, start: int, end: int) -> None:
+        """Create an edge from times in milliseconds since the start of ninja."""
+        self.outputs = [output]
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self) -> int:
+        """Get the duration of this edge in milliseconds."""
+        return self.end - self.start
+
+    @property
+    def kind(self) -> str:
+        """Guess if this edge is a compile step, a link step, or something else."""
+        output = self.outputs[0]
+        if output.endswith(OBJECTS):
+            return "compile"
+        name = Path(output).name
+        if name.endswith(LIBRARIES) or ".so." in name or "." not in name:
+            return "link"
+        return "other"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable representation."""
+        return {
+            "output": self.outputs[0],
+            "kind": self.kind,
+            "start": self.start / 1e3,
+            "duration": self.duration / 1e3,
+        }
+
+
+def mark_log(build: Path):
+    """Mark the start of a build in the Ninja log of a build tree, if it has one."""
+    log = build / ".ninja_log"
+    if log.exists():
+        with log.open("a") as f:
+            f.write(f"{MARKER}\n")
+
+
+def read_log(build: Path) -> List[Edge]:
+    """Read the edges run by the last Ninja invocation in a build tree."""
+    with (build / ".ninja_log").open() as f:
+        lines = f.read().splitlines()
+    marked = MARKER in lines
+    if marked:
+        lines = lines[len(lines) - lines[::-1].index(MARKER) :]
+    edges: Dict[Tuple[int, int, str], Edge] = {}
+    last_end = 0
+    for line in lines:
+        fields = line.split("\t")
+        if line.startswith("#") or len(fields) != 5:
+            continue
+        if not (fields[0].isdigit() and fields[1].isdigit()):
+            # eg. truncated by an interrupted build
+            continue
+        start, end, output, cmdhash = int(fields[0]), int(fields[1]), *fields[3:]
+        # without marker, times restart from 0 at each ninja invocation
+        if not marked and end < last_end:
+            edges = {}
+        last_end = end
+        key = (start, end, cmdhash)
+        if key in edges:
+            edges[key].outputs.append(output)
+        else:
+            edges[key] = Edge(output, start, end)
+    # an output rebuilt in the same run appears twice: keep its last edge
+    by_output = {o: e for e in edges.values() for o in e.outputs}
+    return sorted(set(by_output.values()), key=lambda e: (e.start, e.end))
+
+
+def _tokens(line: str) -> List[str]:
+    """Split a ninja build statement, with "$ ", "$:" and "$$" escapes."""
+    tokens, token, i = [], "", 0
+    while i < len(line):
+        char = line[i]
+        if char == "$" and i + 1 < len(line) and line[i + 1] in " :$":
+            token += line[i + 1]
+            i += 2
+            continue
+        if char in " :":
+            if token:
+                tokens.append(token)
+            if char == ":":
+                tokens.append(":")
+            token = ""
+        else:
+            token += char
+        i += 1
+    if token:
+        tokens.append(token)
+    return tokens
+
+
+def read_graph(path: Path, graph: Optional[Dict[str, List[str]]] = None):
+    """Read the inputs of each output from a ninja file and its includes."""
+    if graph is None:
+        graph = {}
+    with path.open() as f:
+        content = f.read().replace("$\n", "")
+    for line in content.split("\n"):
+        if line.startswith(("include ", "subninja ")):
+            read_graph(path.parent / line.split(" ", 1)[1].strip(), graph)
+        elif line.startswith("build "):
+            tokens = _tokens(line[len("build ") :])
+            colon = tokens.index(":")
+            outputs = [t for t in tokens[:colon] if t != "|"]
+            # skip the rule, and the "|", "||" and "|@" separators
+            inputs = [t for t in tokens[colon + 2 :] if not t.startswith("|")]
+            for output in outputs:
+                graph[output] = inputs
+    return graph
+
+
+def critical_path(edges: List[Edge], graph: Dict[str, List[str]]) -> List[Edge]:
+    """Get the chain of dependent edges with the longest total duration."""
+    durations = {o: e for e in edges for o in e.outputs}
+    cost: Dict[str, int] = {}
+    best: Dict[str, Optional[str]] = {}
+    visiting: Set[str] = set()
+    for root in graph:
+        stack = [root]
+        while stack:
+            output = stack[-1]
+            if output in cost:
+                stack.pop()
+            elif output not in visiting:
+                visiting.add(output)
+                # inputs already visiting are dependency cycles: ninja rejects them
+                stack.extend(
+                    i
+                    for i in graph.get(output, [])
+                    if i not in cost and i not in visiting
+                )
+            else:
+                stack.pop()
+                inputs = graph.get(output, [])
+                previous = max(inputs, key=lambda i: cost.get(i, 0), default=None)
+                edge = durations.get(output)
+                own = edge.duration if edge is not None else 0
+                cost[output] = own + (cost.get(previous, 0) if previous else 0)
+                best[output] = previous
+    path: List[Edge] = []
+    last = max(cost, key=lambda o: cost[o], default=None)
+    while last is not None:
+        edge = durations.get(last)
+        if edge is not None and (not path or path[-1] is not edge):
+            path.append(edge)
+        last = best.get(last)
+    return path[::-1]
+
+
+def parallelism(edges: List[Edge]) -> Dict[str, Any]:
+    """Get the number of edges running over time, and its average and maximum."""
+    events = sorted([(e.start, 1) for e in edges] + [(e.end, -1) for e in edges])
+    timeline: List[Tuple[float, int]] = []
+    running = 0
+    for time, delta in events:
+        running += delta
+        if timeline and timeline[-1][0] == time / 1e3:
+            timeline[-1] = (time / 1e3, running)
+        else:
+            timeline.append((time / 1e3, running))
+    first = min((e.start for e in edges), default=0)
+    wall = max((e.end for e in edges), default=0) - first
+    busy = sum(e.duration for e in edges)
+    return {
+        "average": busy / wall if wall else 0.0,
+        "max": max((n for _, n in timeline), default=0),
+        "timeline": timeline,
+    }
+
+
+def trace_events(edges: List[Edge], origin: float) -> List[Dict[str, Any]]:
+    """Get edges as Chrome trace events, on one thread per parallel job."""
+    threads: List[int] = []
+    events = []
+    for edge in edges:
+        # first job which is free when this edge starts
+        for tid, end in enumerate(threads):
+            if end <= edge.start:
+                threads[tid] = edge.end
+                break
+        else:
+            tid = len(threads)
+            threads.append(edge.end)
+        events.append(
+            {
+                "name": Path(edge.outputs[0]).name,
+                "cat": edge.kind,
+                "ph": "X",
+                "ts": origin * 1e6 + edge.start * 1e3,
+                "dur": edge.duration * 1e3,
+                "pid": 2,
+                "tid": tid + 1,
+                "args": {"outputs": edge.outputs},
+            },
+        )
+    return events
+
+
+def analyze(build: Path) -> Optional[Tuple[Dict[str, Any], List[Edge]]]:
+    """Analyze the last Ninja build in a build tree, if it was built with Ninja."""
+    if not (build / ".ninja_log").exists():
+        LOG.debug("no .ninja_log in %s", build)
+        return None
+    edges = read_log(build)
+    path = critical_path(edges, read_graph(build / "build.ninja"))
+    ret: Dict[str, Any] = {"edges": len(edges), "parallelism": parallelism(edges)}
+    for kind in ["compile", "link"]:
+        slowest = sorted(
+            (e for e in edges if e.kind == kind),
+            key=lambda e: e.duration,
+            reverse=True,
+        )
+        ret[f"slowest {kind}"] = [e.to_dict() for e in slowest[:TOP]]
+        for edge in slowest[:3]:
+            LOG.info(
+                "slow %s: %.1fs for %s", kind, edge.duration / 1e3, edge.outputs[0]
+            )
+    ret["critical path"] = {
+        "duration": sum(e.duration for e in path) / 1e3,
+        "edges": [e.to_dict() for e in path],
+    }
+    LOG.info(
+        "ninja: %s edges, average parallelism %.1f, critical path %.1fs",
+        len(edges),
+        ret["parallelism"]["average"],
+        ret["critical path"]["duration"],
+    )
+    return ret, edges
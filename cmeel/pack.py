@@ -0,0 +1,290 @@
+"""Pack a wheel directory into a .whl archive.
+
+This replaces ``python -m wheel pack``: files are read once, their RECORD hash,
+CRC and compressed data are computed during that read, in parallel, and the
+archive is then written by appending those members in order.
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import os
+import stat
+import struct
+import time
+import zlib
+from base64 import urlsafe_b64encode
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, Iterable, List, Optional, Tuple
+from zipfile import ZIP_DEFLATED, ZipInfo
+
+from .inventory import Inventory, walk_key
+
+LOG = logging.getLogger("cmeel.pack")
+
+CHUNK_SIZE = 1 << 20
+# compressed data kept in memory ahead of the member being written
+WINDOW_SIZE = 256 << 20
+MINIMUM_TIMESTAMP = 315532800  # 1980-01-01 00:00:00 UTC
+# as in zipfile
+ZIP64_LIMIT = (1 << 31) - 1
+ZIP64_VERSION = 45
+DEFLATED_VERSION = 20
+
+
+def deflate(chunks: Iterable[bytes], level: int) -> Tuple[bytes, int, int]:
+    """Compress chunks as a raw deflate stream, and get it with their CRC and size."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc, size, data = 0, 0, []
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        data.append(compressor.compress(chunk))
+    data.append(compressor.flush())
+    return b"".join(data), crc, size
+
+
+def deflated_info(
+    arcname: str,
+    timestamp: float,
+    mode: int,
+    chunks: Iterable[bytes],
+    level: int,
+) -> Tuple[ZipInfo, bytes]:
+    """Compress chunks, and get the zip entry of their member with its data."""
+    info = ZipInfo(arcname, date_time=zipinfo_datetime(timestamp))
+    info.external_attr = mode << 16
+    info.compress_type = ZIP_DEFLATED
+    data, info.CRC, info.file_size = deflate(chunks, level)
+    info.compress_size = len(data)
+    return info, data
+
+
+class Member:
+    """A file read, hashed and compressed in a worker, ready to go in a zip."""
+
+    def __init__(self, path: Path, arcname: str, level: int) -> None:
+        """Read, hash and compress the file at path."""
+        st = path.stat()
+        mode = stat.S_IMODE(st.st_mode) | stat.S_IFMT(st.st_mode)
+        sha256 = hashlib.sha256()
+
+        def read():
+            with path.open("rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    yield chunk
+
+        self.info, self.data = deflated_info(arcname, st.st_mtime, mode, read(), level)
+        digest = urlsafe_b64encode(sha256.digest()).rstrip(b"=").decode()
+        self.record = (arcname, f"sha256={digest}", str(self.info.file_size))
+
+
+class Archive:
+    """A zip archive written from members which are already compressed.
+
+    zipfile has no public API to append compressed data, so local headers come from
+    ZipInfo.FileHeader(), and the central directory is written here, as zipfile does.
+    """
+
+    def __init__(self, f: BinaryIO) -> None:
+        """Write members in an open binary file."""
+        self.f = f
+        self.infos: List[ZipInfo] = []
+
+    def append(self, info: ZipInfo, data: bytes) -> None:
+        """Append a member and its compressed data."""
+        info.header_offset = self.f.tell()
+        self.f.write(info.FileHeader())
+        self.f.write(data)
+        self.infos.append(info)
+
+    def close(self) -> None:
+        """Write the central directory, and the end records."""
+        start = self.f.tell()
+        for info in self.infos:
+            self.f.write(central_directory_entry(info))
+        end = self.f.tell()
+        count, size, offset = len(self.infos), end - start, start
+        if count > 0xFFFF or size > ZIP64_LIMIT or offset > ZIP64_LIMIT:
+            self.f.write(
+                struct.pack(
+                    "<4sQ2H2L4Q",
+                    *(b"PK\x06\x06", 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0),
+                    *(count, count, size, offset),
+                )
+            )
+            self.f.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, end, 1))
+            count = min(count, 0xFFFF)
+            size, offset = min(size, 0xFFFFFFFF), min(offset, 0xFFFFFFFF)
+        self.f.write(
+            struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, count, count, size, offset, 0)
+        )
+
+
+def central_directory_entry(info: ZipInfo) -> bytes:
+    """Get the central directory entry of a member, with zip64 fields if needed."""
+    year, month, day, hour, minute, second = info.date_time
+    dosdate = (year - 1980) << 9 | month << 5 | day
+    dostime = hour << 11 | minute << 5 | (second // 2)
+    file_size, compress_size, header_offset = (
+        info.file_size,
+        info.compress_size,
+        info.header_offset,
+    )
+    zip64: List[int] = []
+    if file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT:
+        zip64 += [file_size, compress_size]
+        file_size = compress_size = 0xFFFFFFFF
+    if header_offset > ZIP64_LIMIT:
+        zip64.append(header_offset)
+        header_offset = 0xFFFFFFFF
+    extra = info.extra
+    version = DEFLATED_VERSION
+    if zip64:
+        extra = struct.pack(f"<HH{len(zip64)}Q", 1, 8 * len(zip64), *zip64) + extra
+        version = ZIP64_VERSION
+    flag_bits = info.flag_bits
+    try:
+        filename = info.filename.encode("ascii")
+    except UnicodeEncodeError:
+        filename = info.filename.encode()
+        flag_bits |= 0x800
+    header = struct.pack(
+        "<4s4B4HL2L5H2L",
+        b"PK\x01\x02",
+        max(version, info.create_version),
+        info.create_system,
+        max(version, info.extract_version),
+        info.reserved,
+        flag_bits,
+        info.compress_type,
+        dostime,
+        dosdate,
+        info.CRC,
+        compress_size,
+        file_size,
+        len(filename),
+        len(extra),
+        len(info.comment),
+        0,
+        info.internal_attr,
+        info.external_attr,
+        header_offset,
+    )
+    return header + filename + extra + info.comment
+
+
+def zipinfo_datetime(timestamp: float) -> Tuple[int, int, int, int, int, int]:
+    """Get a zip timestamp, which can be forced for reproducible builds."""
+    timestamp = int(os.environ.get("SOURCE_DATE_EPOCH", timestamp or time.time()))
+    timestamp = max(timestamp, MINIMUM_TIMESTAMP)
+    return time.gmtime(timestamp)[0:6]  # type: ignore[return-value]
+
+
+def inventory_files(wheel_dir: Path, inventory: Inventory) -> List[Tuple[Path, str]]:
+    """List files to pack from the inventory of an install prefix in wheel_dir."""
+    return [
+        (entry.path, entry.path.relative_to(wheel_dir).as_posix())
+        for entry in inventory
+        if stat.S_ISREG(entry.mode) or entry.path.is_file()
+    ]
+
+
+def list_files(
+    wheel_dir: Path,
+    dist_info: str,
+    inventory: Optional[Inventory] = None,
+) -> List[Tuple[Path, str]]:
+    """List files to pack, in the same order as 'wheel pack'.
+
+    Regular files come first, sorted, then those of the .dist-info directory.
+    RECORD is ignored, as it will be generated.
+    Files of the install prefix are taken from its inventory, if given.
+    """
+    files, deferred = [], []
+    record = f"{dist_info}/RECORD"
+    skip = None
+    if inventory is not None:
+        files = inventory_files(wheel_dir, inventory)
+        skip = inventory.root
+    for root, dirnames, filenames in os.walk(wheel_dir):
+        dirnames.sort()
+        if skip is not None and Path(root) == skip.parent and skip.name in dirnames:
+            dirnames.remove(skip.name)
+        for name in sorted(filenames):
+            path = Path(root) / name
+            if not path.is_file():
+                continue
+            arcname = path.relative_to(wheel_dir).as_posix()
+            if arcname == record:
+                continue
+            if root.endswith(".dist-info"):
+                deferred.append((path, arcname))
+            else:
+                files.append((path, arcname))
+    if inventory is not None:
+        files.sort(key=lambda f: walk_key(Path(f[1])))
+    return files + sorted(deferred, key=lambda f: f[1])
+
+
+def _append(future: "Future[Member]", archive: Archive) -> Tuple[str, str, str]:
+    member = future.result()
+    archive.append(member.info, member.data)
+    return member.record
+
+
+def pack(
+    wheel_dir: Path,
+    wheel_directory,
+    distribution: str,
+    tag: str,
+    build_number: int,
+    jobs: int,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    inventory: Optional[Inventory] = None,
+) -> str:
+    """Pack wheel_dir into a .whl in wheel_directory, and return its file name.
+
+    Files of an install prefix inside wheel_dir are taken from its inventory, if given.
+    """
+    dist_info = f"{distribution}.dist-info"
+    name = f"{distribution}-{build_number}-{tag}.whl"
+    wheel_path = Path(wheel_directory) / name
+    files = list_files(wheel_dir, dist_info, inventory)
+    LOG.info("packing %d files in %s with %d jobs", len(files), wheel_path, jobs)
+
+    records = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor, wheel_path.open("wb") as f:
+        archive = Archive(f)
+        # Keep a bounded window of members compressed ahead of the one being written.
+        pending: Deque[Tuple[Future, int]] = deque()
+        ahead = 0
+        for path, arcname in files:
+            size = path.stat().st_size
+            pending.append((executor.submit(Member, path, arcname, level), size))
+            ahead += size
+            while pending and (len(pending) > 2 * jobs or ahead > WINDOW_SIZE):
+                future, size = pending.popleft()
+                ahead -= size
+                records.append(_append(future, archive))
+        while pending:
+            records.append(_append(pending.popleft()[0], archive))
+
+        record = f"{dist_info}/RECORD"
+        records.append((record, "", ""))
+        with io.StringIO(newline="") as s:
+            csv.writer(s, delimiter=",", quotechar='"', lineterminator="\n").writerows(
+                records,
+            )
+            content = s.getvalue().encode()
+        archive.append(
+            *deflated_info(record, time.time(), 0o664, [content], level),
+        )
+        archive.close()
+
+    LOG.debug("packed '%s'", name)
+    return name
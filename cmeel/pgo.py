@@ -0,0 +1,118 @@
+"""Profile-guided optimization with GCC or Clang.
+
+The project is first built with instrumentation in a separate build tree, where a
+training command runs, by default the test command, to collect profiles. With
+Clang, raw profiles are then merged with ``llvm-profdata``, while GCC merges them
+at runtime. The wheel is then built as usual, using those profiles.
+
+GCC profiles are named after object paths, so ``-fprofile-prefix-path`` (GCC >= 11)
+makes them match between both build trees.
+"""
+
+import logging
+import os
+import shlex
+import shutil
+import sys
+from pathlib import Path
+from subprocess import check_call, run
+from typing import Dict, List
+
+LOG = logging.getLogger("cmeel.pgo")
+
+GCC = "gcc"
+CLANG = "clang"
+MERGED = "merged.profdata"
+
+
+def detect_compiler(env: Dict[str, str]) -> str:
+    """Find if the C++ compiler CMake will use is GCC or Clang."""
+    compiler = env.get("CXX") or env.get("CC") or "c++"
+    cmd = [*shlex.split(compiler), "--version"]
+    version = run(cmd, capture_output=True, text=True, check=True).stdout
+    if "clang" in version.lower():
+        return CLANG
+    if "gcc" in version.lower() or "free software foundation" in version.lower():
+        return GCC
+    err = f"PGO needs GCC or Clang, not {compiler}: {version.splitlines()[:1]}"
+    raise ValueError(err)
+
+
+def add_flags(env: Dict[str, str], flags: List[str]) -> Dict[str, str]:
+    """Append flags to CFLAGS, CXXFLAGS and LDFLAGS, which initialize CMake flags."""
+    ret = env.copy()
+    for var in ["CFLAGS", "CXXFLAGS", "LDFLAGS"]:
+        ret[var] = " ".join([ret.get(var, ""), *flags]).strip()
+    return ret
+
+
+def find_llvm_profdata(env: Dict[str, str]) -> List[str]:
+    """Find llvm-profdata, ideally next to the Clang in use."""
+    if env.get("LLVM_PROFDATA"):
+        return shlex.split(env["LLVM_PROFDATA"])
+    compiler = shutil.which(shlex.split(env.get("CXX") or env.get("CC") or "c++")[0])
+    if compiler is not None:
+        candidate = Path(os.path.realpath(compiler)).parent / "llvm-profdata"
+        if candidate.exists():
+            return [str(candidate)]
+    found = shutil.which("llvm-profdata")
+    if found is not None:
+        return [found]
+    if sys.platform == "darwin":
+        return ["xcrun", "llvm-profdata"]
+    err = "llvm-profdata not found: set LLVM_PROFDATA"
+    raise FileNotFoundError(err)
+
+
+class PGO:
+    """Flags and profile handling for one compiler."""
+
+    def __init__(self, compiler: str, profiles: Path) -> None:
+        """Prepare to store profiles in a directory."""
+        self.compiler = compiler
+        self.profiles = profiles.absolute()
+
+    def generate_flags(self, build: Path) -> List[str]:
+        """Get flags to build with instrumentation in a build tree."""
+        if self.compiler == GCC:
+            return [
+                f"-fprofile-generate={self.profiles}",
+                f"-fprofile-prefix-path={build.absolute()}",
+                "-fprofile-update=atomic",
+            ]
+        return [f"-fprofile-generate={self.profiles}"]
+
+    def use_flags(self, build: Path) -> List[str]:
+        """Get flags to build with the collected profiles in a build tree."""
+        if self.compiler == GCC:
+            return [
+                f"-fprofile-use={self.profiles}",
+                f"-fprofile-prefix-path={build.absolute()}",
+                "-fprofile-partial-training",
+                "-Wno-missing-profile",
+            ]
+        return [
+            f"-fprofile-use={self.profiles / MERGED}",
+            "-Wno-profile-instr-unprofiled",
+            "-Wno-profile-instr-out-of-date",
+        ]
+
+    def reset(self) -> None:
+        """Remove the profiles of a previous training."""
+        shutil.rmtree(self.profiles, ignore_errors=True)
+        self.profiles.mkdir(parents=True)
+
+    def merge(self, env: Dict[str, str]) -> int:
+        """Merge raw profiles if needed, and get their number."""
+        if self.compiler == GCC:
+            count = len(list(self.profiles.rglob("*.gcda")))
+        else:
+            raw = sorted(str(p) for p in self.profiles.glob("*.profraw"))
+            count = len(raw)
+            if raw:
+                cmd = find_llvm_profdata(env)
+                output = f"--output={self.profiles / MERGED}"
+                check_call([*cmd, "merge", output, *raw], env=env)
+        if count == 0:
+            LOG.warning("PGO: the training command produced no profile")
+        return count
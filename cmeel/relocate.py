@@ -0,0 +1,139 @@
+"""Make the install prefix relocatable.
+
+Each ``*.cmake`` and ``*.pc`` file of the inventory is read once on a thread pool,
+to:
+- replace the absolute install path in CMake files by ``${PACKAGE_PREFIX_DIR}``,
+- replace it in pkg-config files by a path relative to ``${pcfiledir}``,
+- check that no temporary build path remains in CMake files.
+
+Files without any match are left untouched.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+from .inventory import Inventory
+from .utils import NonRelocatableError
+
+LOG = logging.getLogger("cmeel.relocate")
+
+WRONG_DIRS = [
+    "/tmp/pip-build-env",
+    "/tmp/pip-req-build",
+    "/opt/_internal",
+]
+
+
+class Relocation:
+    """Result of the relocation of one file."""
+
+    def __init__(self, path: Path, rewritten: bool, duration: float, error: str):
+        """Store what was done on path, and how long it took."""
+        self.path = path
+        self.rewritten = rewritten
+        self.duration = duration
+        self.error = error
+
+
+class Relocator:
+    """Relocate files of an install prefix."""
+
+    def __init__(
+        self,
+        inventory: Inventory,
+        prefix: Path,
+        check_relocatable: bool,
+        fix_pkg_config: bool,
+    ) -> None:
+        """Prepare needles for an install prefix inside a cmeel working prefix."""
+        self.inventory = inventory
+        self.install = inventory.root
+        self.needle = str(self.install).encode()
+        self.check_relocatable = check_relocatable
+        self.fix_pkg_config = fix_pkg_config
+        self.wrong_dirs = [d.encode() for d in [*WRONG_DIRS, str(prefix)]]
+
+    def files(self) -> List[Path]:
+        """List files to process, from the inventory."""
+        suffixes = (".cmake", ".pc") if self.fix_pkg_config else (".cmake",)
+        return [p for p in self.inventory.paths() if p.name.endswith(suffixes)]
+
+    def __call__(self, path: Path) -> Relocation:
+        """Read path once, then fix and check its content."""
+        start = time.perf_counter()
+        content = path.read_bytes()
+        fixed = content
+        error = ""
+        if path.suffix == ".cmake":
+            fixed = content.replace(self.needle, b"${PACKAGE_PREFIX_DIR}")
+            if self.check_relocatable:
+                error = self.check(path, fixed)
+        elif self.needle in content:
+            rel = str(path.parent.relative_to(self.install))
+            fix = "/".join(["${pcfiledir}"] + [".." for _ in rel.split("/")])
+            LOG.warning("fix pkg-config %s: replace %s by %s", path, self.install, fix)
+            fixed = content.replace(self.needle, fix.encode())
+        if fixed != content:
+            tmp = path.with_name(f"{path.name}.fix")
+            tmp.write_bytes(fixed)
+            tmp.replace(path)
+        return Relocation(path, fixed != content, time.perf_counter() - start, error)
+
+    def check(self, path: Path, content: bytes) -> str:
+        """Display lines referencing temporary paths, if any."""
+        if not any(wrong_dir in content for wrong_dir in self.wrong_dirs):
+            return ""
+        lines = content.decode(errors="replace").split("\n")
+        wrong_dirs = [d.decode() for d in self.wrong_dirs]
+        # Get indexes of of problematic lines
+        indexes = [
+            idx
+            for idx, line in enumerate(lines)
+            if any(wrong_dir in line for wrong_dir in wrong_dirs)
+        ]
+        # Get lines at those indexes and around them to display
+        display = [
+            f"{i}: {line}"
+            for i, line in enumerate(lines)
+            if any(idx in indexes for idx in (i - 2, i - 1, i, i + 1, i + 2))
+        ]
+        return f"{path} references temporary paths:\n" + "\n".join(display)
+
+
+def relocate(
+    inventory: Inventory,
+    prefix: Path,
+    check_relocatable: bool,
+    fix_pkg_config: bool,
+    jobs: int,
+) -> List[Relocation]:
+    """Fix and check CMake and pkg-config files of an install prefix."""
+    relocator = Relocator(inventory, prefix, check_relocatable, fix_pkg_config)
+    start = time.perf_counter()
+    files = relocator.files()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        relocations = list(executor.map(relocator, files))
+
+    for relocation in relocations:
+        if relocation.rewritten:
+            inventory.update(relocation.path)
+        LOG.debug(
+            "relocate %s: %s in %.3fms",
+            relocation.path,
+            "rewritten" if relocation.rewritten else "untouched",
+            relocation.duration * 1000,
+        )
+    LOG.info(
+        "relocated %d / %d files in %.3fs",
+        sum(relocation.rewritten for relocation in relocations),
+        len(relocations),
+        time.perf_counter() - start,
+    )
+
+    for relocation in relocations:
+        if relocation.error:
+            raise NonRelocatableError(relocation.error)
+    return relocations
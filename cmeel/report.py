@@ -0,0 +1,143 @@
+"""Build report: timings and resource usage of each build phase.
+
+When the ``profile`` setting is enabled, a JSON report is written next to the
+wheel, and optionally a Chrome trace-event file, to be opened in
+``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+
+import json
+import logging
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+LOG = logging.getLogger("cmeel.report")
+
+# ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class Phase:
+    """Timings and resource usage of one build phase."""
+
+    def __init__(self, name: str, origin: float, enabled: bool) -> None:
+        """Start measuring a phase."""
+        self.name = name
+        self.enabled = enabled
+        self.start = time.perf_counter() - origin
+        self.wall = 0.0
+        self.user = 0.0
+        self.system = 0.0
+        self.children_user = 0.0
+        self.children_system = 0.0
+        self.children_maxrss = 0
+        self.files = 0
+        self.bytes = 0
+        self._wall = time.perf_counter()
+        self._self = resource.getrusage(resource.RUSAGE_SELF)
+        self._children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def stop(self) -> None:
+        """Stop measuring this phase."""
+        self.wall = time.perf_counter() - self._wall
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.user = own.ru_utime - self._self.ru_utime
+        self.system = own.ru_stime - self._self.ru_stime
+        self.children_user = children.ru_utime - self._children.ru_utime
+        self.children_system = children.ru_stime - self._children.ru_stime
+        # This is the peak of the largest child process which terminated so far
+        self.children_maxrss = children.ru_maxrss * MAXRSS_UNIT
+
+    def count(self, path: Path) -> None:
+        """Set files and bytes processed from the content of a directory.
+
+        As this walks the directory, it is only done when the report is enabled.
+        """
+        if not self.enabled:
+            return
+        files = [f for f in path.rglob("*") if f.is_file()] if path.is_dir() else []
+        self.files = len(files)
+        self.bytes = sum(f.stat().st_size for f in files)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable representation."""
+        return {
+            "name": self.name,
+            "start": self.start,
+            "wall": self.wall,
+            "user": self.user,
+            "system": self.system,
+            "children_user": self.children_user,
+            "children_system": self.children_system,
+            "children_maxrss": self.children_maxrss,
+            "files": self.files,
+            "bytes": self.bytes,
+        }
+
+
+class Report:
+    """Collect phases of a build."""
+
+    def __init__(self, profile: str) -> None:
+        """Start a report, which will be written unless profile is "off"."""
+        self.profile = profile
+        self.origin = time.perf_counter()
+        self.phases: List[Phase] = []
+        # additional analyses, eg. of the Ninja log, and their trace events
+        self.sections: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Phase]:
+        """Measure a phase."""
+        phase = Phase(name, self.origin, self.profile != "off")
+        try:
+            yield phase
+        finally:
+            phase.stop()
+            self.phases.append(phase)
+            LOG.debug("%s done in %.3fs", name, phase.wall)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable representation."""
+        return {
+            "wall": time.perf_counter() - self.origin,
+            "phases": [phase.to_dict() for phase in self.phases],
+            **self.sections,
+        }
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        """Get phases and additional events as Chrome trace events."""
+        phases = [
+            {
+                "name": phase.name,
+                "cat": "cmeel",
+                "ph": "X",
+                "ts": phase.start * 1e6,
+                "dur": phase.wall * 1e6,
+                "pid": 1,
+                "tid": 1,
+                "args": phase.to_dict(),
+            }
+            for phase in self.phases
+        ]
+        return phases + self.events
+
+    def write(self, wheel_directory, name: str) -> None:
+        """Write the report next to the wheel, and the trace if requested."""
+        if self.profile == "off":
+            return
+        stem = name[: -len(".whl")]
+        report = Path(wheel_directory) / f"{stem}.cmeel-report.json"
+        LOG.info("write build report in %s", report)
+        with report.open("w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        if self.profile == "trace":
+            trace = Path(wheel_directory) / f"{stem}.cmeel-trace.json"
+            LOG.info("write build trace in %s", trace)
+            with trace.open("w") as f:
+                json.dump({"traceEvents": self.trace_events()}, f)
@@ -0,0 +1,136 @@
+"""Set relative RUNPATH on ELF files of the install prefix.
+
+Each executable and shared library gets ``$ORIGIN``-relative RUNPATH entries
+pointing to ``cmeel.prefix/lib``, where its dependencies are found at runtime,
+either from this wheel or from other cmeel wheels in the same site-packages.
+Absolute paths to the build or install trees are removed.
+
+This needs `patchelf <https://github.com/NixOS/patchelf>`_.
+"""
+
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from subprocess import check_call
+from typing import List, Optional
+
+from .consts import CMEEL_PREFIX
+from .elf import ELF, ELFError, open_elf
+from .inventory import Inventory
+from .relocate import WRONG_DIRS
+from .utils import NonRelocatableError
+
+LOG = logging.getLogger("cmeel.rpath")
+
+
+class RunPath:
+    """RUNPATH of one ELF file, before and after."""
+
+    def __init__(self, path: Path, before: List[str], after: List[str]) -> None:
+        """Store the RUNPATH entries of path."""
+        self.path = path
+        self.before = before
+        self.after = after
+
+
+class RunPathFixer:
+    """Compute and set RUNPATH of ELF files in an install prefix."""
+
+    def __init__(
+        self,
+        inventory: Inventory,
+        prefix: Path,
+        lib_dirs: List[Path],
+        patchelf: str,
+    ) -> None:
+        """Prepare for an install prefix, with other cmeel lib_dirs available."""
+        install = inventory.root
+        self.inventory = inventory
+        self.install = install
+        self.lib = install / "lib"
+        self.lib_dirs = [self.lib, *lib_dirs]
+        self.patchelf = patchelf
+        self.wrong = [str(install), str(prefix), *WRONG_DIRS]
+
+    def files(self) -> List[Path]:
+        """List ELF executables and shared libraries, from the inventory."""
+        return self.inventory.elf_files()
+
+    def keep(self, entry: str) -> bool:
+        """Check if an existing RUNPATH entry is still valid in the wheel."""
+        if entry.startswith(("$ORIGIN", "${ORIGIN}")):
+            return True
+        return CMEEL_PREFIX not in entry and not entry.startswith(tuple(self.wrong))
+
+    def expected(self, path: Path, elf: ELF) -> List[str]:
+        """Compute the RUNPATH that path should have."""
+        ret = []
+        if any((d / needed).exists() for needed in elf.needed for d in self.lib_dirs):
+            rel = os.path.relpath(self.lib, path.parent)
+            ret.append("$ORIGIN" if rel == "." else f"$ORIGIN/{rel}")
+        for entry in elf.runpath:
+            if self.keep(entry) and entry not in ret:
+                ret.append(entry)
+        return ret
+
+    def __call__(self, path: Path) -> Optional[RunPath]:
+        """Set the RUNPATH of path if needed, and verify it."""
+        try:
+            with open_elf(path) as elf:
+                if not elf.dynamic:
+                    return None
+                before = elf.runpath
+                after = self.expected(path, elf)
+        except ELFError as e:
+            LOG.debug("skip %s: %s", path, e)
+            return None
+        if before == after:
+            return RunPath(path, before, after)
+        if after:
+            check_call([self.patchelf, "--set-rpath", ":".join(after), str(path)])
+        else:
+            check_call([self.patchelf, "--remove-rpath", str(path)])
+        with open_elf(path) as elf:
+            written = elf.runpath
+        if written != after:
+            err = f"{path}: RUNPATH is {written} instead of {after}"
+            raise NonRelocatableError(err)
+        return RunPath(path, before, after)
+
+
+def fix_rpath(
+    inventory: Inventory,
+    prefix: Path,
+    lib_dirs: List[Path],
+    jobs: int,
+) -> List[RunPath]:
+    """Set relative RUNPATH on ELF files of an install prefix."""
+    if sys.platform != "linux" or not inventory.elf_files():
+        # nothing to fix
+        return []
+    patchelf = shutil.which("patchelf")
+    if patchelf is None:
+        LOG.warning("patchelf not found: RUNPATH of ELF files are not fixed")
+        return []
+    start = time.perf_counter()
+    fixer = RunPathFixer(inventory, prefix, lib_dirs, patchelf)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(fixer, fixer.files())
+        runpaths = [r for r in results if r is not None]
+    for runpath in runpaths:
+        if runpath.before != runpath.after:
+            inventory.update(runpath.path)
+            LOG.debug(
+                "%s: RUNPATH %s -> %s", runpath.path, runpath.before, runpath.after
+            )
+    LOG.info(
+        "fixed RUNPATH of %d / %d ELF files in %.3fs",
+        sum(r.before != r.after for r in runpaths),
+        len(runpaths),
+        time.perf_counter() - start,
+    )
+    return runpaths
@@ -1,27 +1,47 @@
-"""Cmeel run."""
+"""Cmeel run.
+
+Wrappers are generated at build time with what the launch of their executable
+needs, so that this only has to set LD_LIBRARY_PATH and replace the process.
+"""
 
 import os
 import sys
-from pathlib import Path
-from subprocess import run
 
 from .consts import CMEEL_PREFIX
 
 
-def cmeel_run():
-    """Wrap an executable inside cmeel prefix."""
-    prefix = Path(__file__).parent.parent / CMEEL_PREFIX  # TODO: not uniq
+def cmeel_run(library_path: bool = True, variants: bool = False):
+    """Replace this process by an executable inside cmeel prefix.
+
+    The executable is started with os.execv, so it keeps this process id, and
+    receives signals and returns its exit code directly.
+
+    library_path is set if the executable has no RUNPATH relative to its location,
+    as in wheels built before it was fixed, and variants if the wheel provides
+    libraries built for some CPU levels.
+    """
+    # TODO: not uniq
+    site = os.path.dirname(os.path.dirname(__file__))  # noqa: PTH120
+    prefix = os.path.join(site, CMEEL_PREFIX)  # noqa: PTH118
+    name = os.path.basename(sys.argv[0])  # noqa: PTH119
+    exe = os.path.join(prefix, "bin", name)  # noqa: PTH118
+    lib = os.path.join(prefix, "lib")  # noqa: PTH118
+
+    ld_library_path = os.environ.get("LD_LIBRARY_PATH", "")
+    if library_path and lib not in ld_library_path:
+        ld_library_path = f"{lib}:{ld_library_path}".rstrip(":")
+    if variants:
+        # Only the CPU running this knows its level, and the loader may choose
+        from pathlib import Path
 
-    exe = Path(sys.argv[0]).name
-    sys.argv[0] = prefix / "bin" / exe
+        from .isa import variant_dir
 
-    # TODO: RPATH would be better
-    lib = f"{prefix}/lib"
-    if "LD_LIBRARY_PATH" in os.environ:
-        if lib not in os.environ["LD_LIBRARY_PATH"]:
-            os.environ["LD_LIBRARY_PATH"] = f"{lib}:{os.environ['LD_LIBRARY_PATH']}"
-    else:
-        os.environ["LD_LIBRARY_PATH"] = lib
+        variant = variant_dir(Path(lib))
+        if variant is not None and str(variant) not in ld_library_path:
+            ld_library_path = f"{variant}:{ld_library_path}".rstrip(":")
+    if ld_library_path:
+        os.environ["LD_LIBRARY_PATH"] = ld_library_path
 
-    exe = run(sys.argv, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
-    sys.exit(exe.returncode)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(exe, [exe, *sys.argv[1:]])
@@ -0,0 +1,142 @@
+"""Scan the whole install prefix for temporary build paths.
+
+Each file is memory-mapped and searched for the same needles as CMake files:
+pip temporary directories, manylinux internals, and the cmeel working prefix.
+Findings are errors in CMake files. In other files used to find or link the
+package (pkg-config, libtool and qmake files, ELF dynamic entries like RUNPATH, and
+symlink targets), they are only errors with ``strict-relocatable``. They are
+warnings elsewhere, eg. for paths embedded in binaries by debug info.
+
+As ``mmap.find`` holds the GIL, large trees are scanned by a process pool.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+
+from .elf import DT_NAMES, ELF, ELFError, is_elf, map_file
+from .inventory import Inventory
+from .relocate import WRONG_DIRS
+from .utils import NonRelocatableError
+
+LOG = logging.getLogger("cmeel.scan")
+
+ERROR_SUFFIXES = (".cmake",)
+STRICT_SUFFIXES = (".pc", ".la", ".prl")
+
+# Below this total size, starting worker processes is not worth it
+PARALLEL_SIZE = 64 << 20
+
+
+class Finding:
+    """A temporary path found in a file."""
+
+    def __init__(self, path: str, needle: str, where: str, error: bool) -> None:
+        """Store where needle was found in path."""
+        self.path = path
+        self.needle = needle
+        self.where = where
+        self.error = error
+
+    def __str__(self) -> str:
+        """Render this finding as a line."""
+        kind = "error" if self.error else "warning"
+        return f"{kind}: {self.path}: {self.where} references {self.needle}"
+
+
+class Scanner:
+    """Search needles in files of an install prefix."""
+
+    def __init__(self, install: Path, prefix: Path, strict: bool) -> None:
+        """Prepare needles for an install prefix inside a cmeel working prefix."""
+        self.install = install
+        self.needles = [d.encode() for d in [*WRONG_DIRS, str(prefix)]]
+        self.strict = strict
+
+    def __call__(self, path: Path) -> List[Finding]:
+        """Scan one file."""
+        rel = str(path.relative_to(self.install))
+        if path.is_symlink():
+            target = os.readlink(path).encode()
+            return [
+                Finding(rel, needle.decode(), "symlink target", self.strict)
+                for needle in self.needles
+                if needle in target
+            ]
+        if path.stat().st_size == 0:
+            return []
+        with map_file(path) as m:
+            found = [needle for needle in self.needles if m.find(needle) != -1]
+            if not found:
+                return []
+            if is_elf(m):
+                return self.scan_elf(rel, m, found)
+        error = path.name.endswith(ERROR_SUFFIXES) or (
+            self.strict and path.name.endswith(STRICT_SUFFIXES)
+        )
+        return [Finding(rel, n.decode(), "content", error) for n in found]
+
+    def scan_elf(self, rel: str, data, found: List[bytes]) -> List[Finding]:
+        """Report needles in dynamic entries as errors if strict, else as warnings."""
+        ret = []
+        try:
+            elf = ELF(data)
+            entries = [
+                (DT_NAMES[tag], elf.string(value))
+                for tag, value, _ in elf.dynamic
+                if tag in DT_NAMES
+            ]
+        except ELFError as e:
+            LOG.debug("can't parse %s: %s", rel, e)
+            entries = []
+        for needle in found:
+            dynamic = [
+                (name, value) for name, value in entries if needle.decode() in value
+            ]
+            for name, value in dynamic:
+                where = f"{name} {value}"
+                ret.append(Finding(rel, needle.decode(), where, self.strict))
+            if not dynamic:
+                where = f"content at offset {data.find(needle)}"
+                ret.append(Finding(rel, needle.decode(), where, False))
+        return ret
+
+
+def scan(
+    inventory: Inventory,
+    prefix: Path,
+    check_relocatable: bool,
+    strict: bool,
+    jobs: int,
+):
+    """Scan an install prefix, log warnings, and raise on errors if checking."""
+    start = time.perf_counter()
+    scanner = Scanner(inventory.root, prefix, strict)
+    files = inventory.paths()
+    size = inventory.size
+    if jobs > 1 and size > PARALLEL_SIZE:
+        chunksize = max(1, len(files) // (4 * jobs))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(scanner, files, chunksize=chunksize))
+    else:
+        results = [scanner(f) for f in files]
+    findings = [finding for result in results for finding in result]
+    LOG.info(
+        "scanned %d files, %d bytes in %.3fs",
+        len(files),
+        size,
+        time.perf_counter() - start,
+    )
+
+    for finding in findings:
+        if not finding.error:
+            LOG.warning("%s", finding)
+    errors = [str(finding) for finding in findings if finding.error]
+    if errors and check_relocatable:
+        raise NonRelocatableError("\n".join(errors))
+    for error in errors:
+        LOG.warning("%s", error)
+    return findings
@@ -1,9 +1,15 @@
 """Generate .tar.gz source distribution."""
 
+import gzip
+import io
 import logging
+import os
 import tarfile
+import time
+from fnmatch import fnmatch
 from pathlib import Path
-from tempfile import TemporaryDirectory
+from subprocess import CalledProcessError, check_output
+from typing import List
 
 try:
     import tomllib  # type: ignore
@@ -11,20 +17,59 @@ except ModuleNotFoundError:
     import tomli as tomllib  # type: ignore
 
 from .metadata import metadata
-from .utils import normalize
+from .utils import dotget, normalize
 
 LOG = logging.getLogger("cmeel.sdist")
 
 
-def sdist_impl(sdist_directory) -> str:
-    """Implement the build_sdist entry point."""
+def list_files(excludes: List[str]) -> List[str]:
+    """List files tracked by git, including submodules, without excluded ones."""
+    files = check_output(
+        ["git", "ls-files", "-z", "--recurse-submodules"],
+        text=True,
+    ).split("\0")
+    files = [f for f in files if f and os.path.lexists(f)]
+
+    # Respect "export-ignore" git attributes, as git archive does.
+    attrs = check_output(
+        ["git", "check-attr", "-z", "--stdin", "export-ignore"],
+        input="\0".join(files),
+        text=True,
+    ).split("\0")
+    ignored = {
+        path
+        for path, value in zip(attrs[::3], attrs[2::3])
+        if value not in ("unspecified", "unset")
+    }
+
+    return [
+        f
+        for f in files
+        if f not in ignored and not any(fnmatch(f, exclude) for exclude in excludes)
+    ]
+
+
+def source_date_epoch() -> int:
+    """Get the date of the sources: SOURCE_DATE_EPOCH, or the last commit time."""
+    if "SOURCE_DATE_EPOCH" in os.environ:
+        return int(os.environ["SOURCE_DATE_EPOCH"])
     try:
-        import git_archive_all
-    except ImportError as e:
-        err = "You need the 'build' extra option to use this build module.\n"
-        err += "For this you can install the 'cmeel[build]' package."
-        raise ImportError(err) from e
+        return int(check_output(["git", "log", "-1", "--format=%ct"], text=True))
+    except (OSError, CalledProcessError, ValueError):
+        return int(time.time())
 
+
+def normalize_member(info: tarfile.TarInfo, mtime: int) -> tarfile.TarInfo:
+    """Drop the date, owner and umask of a file, for reproducible archives."""
+    info.mtime = mtime
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    info.mode = 0o755 if info.isdir() or info.mode & 0o100 else 0o644
+    return info
+
+
+def sdist_impl(sdist_directory) -> str:
+    """Implement the build_sdist entry point."""
     LOG.info("load conf from pyproject.toml")
     with Path("pyproject.toml").open("rb") as f:
         pyproject = tomllib.load(f)
@@ -32,30 +77,31 @@ def sdist_impl(sdist_directory) -> str:
     conf = pyproject["project"]
     conf["name"] = normalize(conf["name"])
     distribution = f"{conf['name'].replace('-', '_')}-{conf['version']}"
+    excludes = dotget(pyproject, "tool.cmeel.sdist-exclude", [])
+    level = dotget(pyproject, "tool.cmeel.sdist-compression-level", 9)
+    sdist = Path(sdist_directory) / f"{distribution}.tar.gz"
 
-    # tarfile can't add PKG-INFO to a .tar.gz, so we have to make a tmp one
-    with TemporaryDirectory() as tmp:
-        tmp_pkg = Path(tmp) / "PKG-INFO"
-        tmp_tar = Path(tmp) / f"{distribution}.tar.gz"
-        def_tar = Path(sdist_directory) / f"{distribution}.tar.gz"
+    mtime = source_date_epoch()
 
-        LOG.info("archive git repository and its submodules in {tmp}")
-        git_archive_all.main(
-            ["git_archive_all.py", str(tmp_tar)],
-        )
+    LOG.info("archive git repository and its submodules in %s", sdist)
+    with gzip.GzipFile(
+        sdist, "wb", compresslevel=level, mtime=mtime
+    ) as gz, tarfile.open(fileobj=gz, mode="w") as tar:
+        for path in sorted(list_files(excludes)):
+            tar.add(
+                path,
+                f"{distribution}/{path}",
+                recursive=False,
+                filter=lambda info: normalize_member(info, mtime),
+            )
 
         LOG.info("write PKG-INFO file")
         requires = pyproject["build-system"]["requires"]
-        with tmp_pkg.open("w") as f:
-            f.write("\n".join(metadata(conf, requires)))
-
-        LOG.info("create final archive with previous one + PKG-INFO")
-        with tarfile.open(tmp_tar, "r") as tr, tarfile.open(def_tar, "w:gz") as tw:
-            for member in tr.getmembers():
-                fileobj = None
-                if member.type not in [tarfile.LNKTYPE, tarfile.SYMTYPE]:
-                    fileobj = tr.extractfile(member)
-                tw.addfile(member, fileobj)
-            tw.add(str(tmp_pkg), f"{distribution}/PKG-INFO")
+        pkg_info = "\n".join(metadata(conf, requires)).encode()
+        info = tarfile.TarInfo(f"{distribution}/PKG-INFO")
+        info.size = len(pkg_info)
+        info.mtime = mtime
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(pkg_info))
 
     return distribution
@@ -0,0 +1,205 @@
+"""Strip debug info from ELF files of the install prefix.
+
+Debug sections are removed with ``strip --strip-debug``. To keep them, they are
+first extracted with ``objcopy --only-keep-debug`` in ``.debug`` files named by
+GNU build id, as in ``/usr/lib/debug/.build-id``, and the stripped files get a
+``.gnu_debuglink`` to them. Those are then packed in a separate ``-debug``
+wheel, or in a tarball next to the wheel.
+"""
+
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from subprocess import check_call
+from typing import List, Optional, Set
+
+from .consts import CMEEL_PREFIX
+from .elf import ELFError, open_elf
+from .inventory import Inventory
+from .pack import pack
+
+LOG = logging.getLogger("cmeel.strip")
+
+SPLIT_DEBUG = ["off", "wheel", "tarball"]
+DEBUG_DIR = "lib/debug"
+
+
+class Stripped:
+    """Sizes of one ELF file before and after stripping, and its debug file."""
+
+    def __init__(
+        self,
+        path: Path,
+        before: int,
+        after: int,
+        debug: Optional[Path],
+    ) -> None:
+        """Store the result of stripping path."""
+        self.path = path
+        self.before = before
+        self.after = after
+        self.debug = debug
+
+
+class Stripper:
+    """Strip ELF files in an install prefix, and keep their debug info if asked."""
+
+    def __init__(
+        self,
+        inventory: Inventory,
+        debug_dir: Optional[Path],
+        strip: str,
+        objcopy: Optional[str],
+    ) -> None:
+        """Prepare for an install prefix, with debug files extracted in debug_dir."""
+        self.inventory = inventory
+        self.install = inventory.root
+        self.debug_dir = debug_dir
+        self.strip = strip
+        self.objcopy = objcopy
+        self.lock = threading.Lock()
+        self.extracted: Set[Path] = set()
+
+    def files(self) -> List[Path]:
+        """List ELF files, from the inventory."""
+        return self.inventory.elf_files()
+
+    def debug_file(self, path: Path, build_id: Optional[str]) -> Path:
+        """Get where to extract the debug info of path."""
+        assert self.debug_dir is not None
+        if build_id:
+            return self.debug_dir / ".build-id" / build_id[:2] / f"{build_id[2:]}.debug"
+        return self.debug_dir / f"{path.relative_to(self.install)}.debug"
+
+    def __call__(self, path: Path) -> Optional[Stripped]:
+        """Strip path if it has debug info, after extracting it if asked."""
+        try:
+            with open_elf(path) as elf:
+                sections = elf.sections()
+                build_id = elf.build_id
+        except ELFError as e:
+            LOG.debug("skip %s: %s", path, e)
+            return None
+        if not any(s.startswith((".debug_", ".zdebug_")) for s in sections):
+            return None
+        before = path.stat().st_size
+        debug, first = None, False
+        if self.debug_dir is not None and self.objcopy is not None:
+            debug = self.debug_file(path, build_id)
+            with self.lock:
+                # copies of a file have the same build id: extract it once
+                first = debug not in self.extracted
+                self.extracted.add(debug)
+            if first:
+                debug.parent.mkdir(parents=True, exist_ok=True)
+                check_call([self.objcopy, "--only-keep-debug", str(path), str(debug)])
+            else:
+                debug = None
+        check_call([self.strip, "--strip-debug", str(path)])
+        if debug is not None and self.objcopy is not None:
+            check_call([self.objcopy, f"--add-gnu-debuglink={debug}", str(path)])
+        return Stripped(path, before, path.stat().st_size, debug)
+
+
+def strip(
+    inventory: Inventory,
+    debug_dir: Optional[Path],
+    jobs: int,
+) -> List[Stripped]:
+    """Strip debug info from ELF files of an install prefix, in parallel."""
+    tool = shutil.which(os.environ.get("STRIP", "strip"))
+    objcopy = shutil.which(os.environ.get("OBJCOPY", "objcopy"))
+    if tool is None:
+        LOG.warning("strip not found: debug info is kept")
+        return []
+    if debug_dir is not None and objcopy is None:
+        LOG.warning("objcopy not found: debug info is not split")
+    start = time.perf_counter()
+    stripper = Stripper(inventory, debug_dir, tool, objcopy)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(stripper, stripper.files())
+        stripped = [r for r in results if r is not None]
+    for result in stripped:
+        inventory.update(result.path)
+        LOG.debug("%s: %d -> %d bytes", result.path, result.before, result.after)
+    debug_size = sum(r.debug.stat().st_size for r in stripped if r.debug is not None)
+    LOG.info(
+        "stripped %d ELF files from %d to %d bytes (%d bytes of debug files) in %.3fs",
+        len(stripped),
+        sum(r.before for r in stripped),
+        sum(r.after for r in stripped),
+        debug_size,
+        time.perf_counter() - start,
+    )
+    return stripped
+
+
+def debug_tarball(
+    install: Path,
+    stripped: List[Stripped],
+    wheel_directory,
+    wheel: str,
+) -> str:
+    """Write debug files next to the wheel, with links by build id."""
+    name = wheel[: -len(".whl")] + ".debug.tar.gz"
+    with tarfile.open(Path(wheel_directory) / name, "w:gz") as tar:
+        for result in stripped:
+            if result.debug is None:
+                continue
+            arcname = f"{result.path.relative_to(install)}.debug"
+            tar.add(result.debug, arcname=arcname)
+            if result.debug.parent.parent.name == ".build-id":
+                link = tarfile.TarInfo(
+                    f".build-id/{result.debug.parent.name}/{result.debug.name}",
+                )
+                link.type = tarfile.SYMTYPE
+                link.mode = 0o777
+                link.linkname = f"../../{arcname}"
+                tar.addfile(link)
+    LOG.info("debug files in %s", name)
+    return name
+
+
+def debug_wheel(
+    prefix: Path,
+    conf,
+    distribution: str,
+    tag: str,
+    build_number: int,
+    wheel_directory,
+    jobs: int,
+) -> str:
+    """Pack debug files in a <name>-debug wheel, requiring the main one."""
+    wheel_dir = prefix / "debug-whl"
+    name = f"{conf['name']}-debug"
+    debug_distribution = f"{name.replace('-', '_')}-{conf['version']}"
+    dist_info = wheel_dir / f"{debug_distribution}.dist-info"
+    dist_info.mkdir(parents=True)
+    with (dist_info / "METADATA").open("w") as f:
+        f.write(
+            "\n".join(
+                [
+                    "Metadata-Version: 2.1",
+                    f"Name: {name}",
+                    f"Version: {conf['version']}",
+                    f"Summary: Debug symbols of {conf['name']}",
+                    f"Requires-Dist: {conf['name']} == {conf['version']}",
+                    "",
+                ],
+            ),
+        )
+    main_dist_info = prefix / "whl" / f"{distribution}.dist-info"
+    shutil.copy(main_dist_info / "WHEEL", dist_info / "WHEEL")
+    ret = pack(wheel_dir, wheel_directory, debug_distribution, tag, build_number, jobs)
+    LOG.info("debug files in %s", ret)
+    return ret
+
+
+def debug_wheel_dir(prefix: Path) -> Path:
+    """Get where debug files are extracted, in the tree of the -debug wheel."""
+    return prefix / "debug-whl" / CMEEL_PREFIX / DEBUG_DIR
@@ -8,8 +8,10 @@ import warnings
 from importlib.util import find_spec
 from pathlib import Path
 from subprocess import CalledProcessError, check_call, check_output, run
+from typing import List, Optional
 
 from .config import cmeel_config
+from .elf import open_elf
 
 LOG = logging.getLogger("cmeel.utils")
 
@@ -20,7 +22,13 @@ PATCH_IGNORE = [
     "The next patch would delete",
 ]
 
-EXECUTABLE = ["#!python", "from cmeel.run import cmeel_run", "cmeel_run()"]
+EXECUTABLE = [
+    "#!python",
+    "from cmeel.run import cmeel_run",
+    "cmeel_run(library_path={library_path}, variants={variants})",
+]
+
+TEST_CMD = ["cmake", "--build", "BUILD_DIR", "-t", "test"]
 
 
 class PatchError(CalledProcessError):
@@ -90,8 +98,12 @@ def log_pip():
                 LOG.debug("  %s", dep)
 
 
-def get_tag(pyproject) -> str:
-    """Find the correct tag for the wheel."""
+def get_tag(pyproject, interpreter: Optional[str] = None) -> str:
+    """Find the correct tag for the wheel.
+
+    interpreter and abi tags, eg. "cp313-cp313t", can be given for another
+    interpreter than the current one, on the same platform.
+    """
     try:
         from packaging.tags import sys_tags
     except ImportError as e:
@@ -100,6 +112,10 @@ def get_tag(pyproject) -> str:
         raise ImportError(err) from e
 
     tag = str(next(sys_tags()))
+    minor = sys.version_info.minor
+    if interpreter is not None:
+        tag = f"{interpreter}-{tag.split('-')[-1]}"
+        minor = int(interpreter.split("-")[0][len("cp3") :])
     # handle cross compilation on macOS with cibuildwheel
     # ref. https://github.com/pypa/cibuildwheel/blob/6549a9/cibuildwheel/macos.py#L221
     if "_PYTHON_HOST_PLATFORM" in os.environ:
@@ -128,14 +144,14 @@ def get_tag(pyproject) -> str:
             DeprecationWarning,
             stacklevel=2,
         )
-        tag = f"py3{sys.version_info.minor}-none-any"
+        tag = f"py3{minor}-none-any"
     else:
         binaries = dotget(pyproject, "tool.cmeel.has-binaries", True)
         sitelib = dotget(pyproject, "tool.cmeel.has-sitelib", True)
         if not binaries and not sitelib:
             tag = "py3-none-any"
         elif not binaries:
-            tag = f"py3{sys.version_info.minor}-none-any"
+            tag = f"py3{minor}-none-any"
         elif not sitelib:
             tag = "-".join(["py3", "none", tag.split("-")[-1]])
     return tag
@@ -161,68 +177,63 @@ def patch():
             LOG.info("this patch was already applied")
 
 
-def expose_bin(install: Path, wheel_dir: Path, distribution: str):
-    """Add scripts wrapping calls to CMEEL_PREFIX/bin/ executables."""
+def needs_library_path(exe: Path) -> bool:
+    """Check if exe was packed without a RUNPATH relative to its location."""
+    try:
+        with open_elf(exe) as elf:
+            runpath = elf.runpath
+    except (OSError, ValueError):
+        return True
+    return not any(p.startswith(("$ORIGIN", "${ORIGIN}")) for p in runpath)
+
+
+def wrapper(exe: Path, variants: bool = False) -> List[str]:
+    """Get the script calling exe, with what its launch needs decided now."""
+    return [
+        line.format(library_path=needs_library_path(exe), variants=variants)
+        for line in EXECUTABLE
+    ]
+
+
+def expose_bin(
+    install: Path,
+    wheel_dir: Path,
+    distribution: str,
+    executables: Optional[List[Path]] = None,
+    variants: bool = False,
+):
+    """Add scripts wrapping calls to CMEEL_PREFIX/bin/ executables.
+
+    Those are listed from the install prefix, unless given. This must run once
+    their RUNPATH is final, as the wrappers only set LD_LIBRARY_PATH if needed.
+    """
     bin_dir = install / "bin"
-    if bin_dir.is_dir():
+    if executables is None and bin_dir.is_dir():
+        executables = list(bin_dir.glob("*"))
+    if executables:
         LOG.info("adding executables")
         scripts = wheel_dir / f"{distribution}.data" / "scripts"
         scripts.mkdir(parents=True)
-        for fn in bin_dir.glob("*"):
+        for fn in executables:
             executable = scripts / fn.name
             with fn.open("rb") as fo:
                 is_script = fo.read(2) == b"#!"
             with executable.open("w") as fe:
-                content = fn.read_text().split("\n") if is_script else EXECUTABLE
+                content = (
+                    fn.read_text().split("\n") if is_script else wrapper(fn, variants)
+                )
                 if "python" in content[0]:
                     content = ["#!python", *content[1:]]
                 fe.write("\n".join(content))
             executable.chmod(0o755)
 
 
-def ensure_relocatable(check_relocatable: bool, install: Path, prefix: Path):
-    """Ensure no cmake file contains wrong absolute paths."""
-    if not check_relocatable:
-        return
-    LOG.info("check generated cmake files")
-    wrong_dirs = [
-        "/tmp/pip-build-env",
-        "/tmp/pip-req-build",
-        "/opt/_internal",
-        str(prefix),
-    ]
-    for fc in install.glob("**/*.cmake"):
-        with fc.open() as f:
-            cmake_file = f.read()
-            if any(wrong_dir in cmake_file for wrong_dir in wrong_dirs):
-                lines = cmake_file.split("\n")
-                # Get indexes of of problematic lines
-                indexes = [
-                    idx
-                    for idx, line in enumerate(lines)
-                    if any(wrong_dir in line for wrong_dir in wrong_dirs)
-                ]
-                # Get lines at those indexes and around them to display
-                display = [
-                    f"{i}: {line}"
-                    for i, line in enumerate(lines)
-                    if any(idx in indexes for idx in (i - 2, i - 1, i, i + 1, i + 2))
-                ]
-                raise NonRelocatableError(
-                    f"{fc} references temporary paths:\n" + "\n".join(display),
-                )
-
-
 def launch_tests(before: bool, now: bool, pyproject, build: Path):
     """Launch tests, before or after the install."""
     if not now:
         return
 
-    test_cmd = deprecate_build_system(
-        pyproject,
-        "test-cmd",
-        ["cmake", "--build", "BUILD_DIR", "-t", "test"],
-    )
+    test_cmd = deprecate_build_system(pyproject, "test-cmd", TEST_CMD)
     LOG.info("test {} install".format("before") if before else "after")
     test_env = cmeel_config.get_test_env()
     cmd = [i.replace("BUILD_DIR", str(build)) for i in test_cmd]
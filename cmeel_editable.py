@@ -0,0 +1,123 @@
+"""Rebuild editable installs of cmeel projects when their sources changed.
+
+The ``.pth`` of an editable wheel built with ``editable-rebuild`` registers a
+finder here. On the first import of one of its modules, the sources listed at build
+time are checked against their stamp, and if any changed, the build tree is built
+and installed again. The finder then removes itself, so other imports are not
+slowed down.
+
+This is imported at every interpreter startup, so it only relies on os.path, and
+other modules are imported when needed.
+"""
+
+import os
+import sys
+
+STAMP = "cmeel-editable.json"
+
+
+def list_sources(source):
+    """List files of the sources, relative to them: from git if possible."""
+    from subprocess import DEVNULL, CalledProcessError, check_output
+
+    cmd = ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+    try:
+        out = check_output(cmd, cwd=source, stderr=DEVNULL, text=True)
+        files = [f for f in out.split("\0") if f]
+    except (OSError, CalledProcessError):
+        files = []
+        for root, dirs, names in os.walk(source):
+            dirs[:] = [d for d in dirs if not d.startswith((".", "build"))]
+            rel = os.path.relpath(root, source)
+            files += [os.path.normpath(os.path.join(rel, n)) for n in names]  # noqa: PTH118
+    # build trees may not be ignored by git
+    files = [f for f in files if not f.startswith((".", "build"))]
+    index = os.path.join(".git", "index")  # noqa: PTH118
+    if os.path.exists(os.path.join(source, index)):  # noqa: PTH110, PTH118
+        # tracked files added or removed
+        files.append(index)
+    return files
+
+
+def stamp(source, files):
+    """Get the latest mtime of files, or -1 if one is missing."""
+    latest = 0
+    for name in files:
+        try:
+            latest = max(latest, os.stat(os.path.join(source, name)).st_mtime_ns)  # noqa: PTH116, PTH118
+        except OSError:
+            return -1
+    return latest
+
+
+def write_stamp(source, build):
+    """Record the files of the sources and their stamp, after a build."""
+    import json
+
+    files = list_sources(source)
+    data = {"files": files, "stamp": stamp(source, files)}
+    with open(os.path.join(build, STAMP), "w") as f:  # noqa: PTH118, PTH123
+        json.dump(data, f)
+
+
+def changed(source, build):
+    """Check if the sources changed since the last build."""
+    import json
+
+    try:
+        with open(os.path.join(build, STAMP)) as f:  # noqa: PTH118, PTH123
+            data = json.load(f)
+    except (OSError, ValueError):
+        return True
+    return stamp(source, data["files"]) != data["stamp"]
+
+
+def rebuild(name, source, build):
+    """Build and install the build tree again, and record the new stamp."""
+    from subprocess import CalledProcessError, check_call
+
+    sys.stderr.write(f"cmeel: {name} sources changed, rebuilding {build}\n")
+    env = dict(os.environ, CMAKE_INSTALL_MODE="ABS_SYMLINK")
+    # without a number, make would run unlimited jobs
+    jobs = os.environ.get("CMEEL_JOBS", "")
+    jobs = jobs if jobs.isdigit() else str(os.cpu_count() or 1)
+    try:
+        check_call(["cmake", "--build", build, "--parallel", jobs], env=env, stdout=2)
+        check_call(["cmake", "--install", build], env=env, stdout=2)
+    except (OSError, CalledProcessError) as e:
+        sys.stderr.write(f"cmeel: rebuilding {name} failed, it may be outdated: {e}\n")
+        return
+    write_stamp(source, build)
+
+
+class Finder:
+    """Meta path finder which rebuilds on the first import of a module of sitelib."""
+
+    def __init__(self, name, source, build, sitelib):
+        """Watch the top level modules of sitelib."""
+        self.name = name
+        self.source = source
+        self.build = build
+        self.sitelib = sitelib
+        self.modules = None
+
+    def find_spec(self, fullname, path=None, target=None):
+        """Rebuild if needed on the first import of a module of sitelib."""
+        if self.modules is None:
+            try:
+                names = os.listdir(self.sitelib)  # noqa: PTH208
+            except OSError:
+                names = []
+            self.modules = {n.split(".")[0] for n in names}
+        if fullname.partition(".")[0] in self.modules and self in sys.meta_path:
+            sys.meta_path.remove(self)
+            if changed(self.source, self.build):
+                rebuild(self.name, self.source, self.build)
+        # the module itself is then found by the following finders
+
+
+def register(name, source, build, sitelib):
+    """Check the sources of an editable install at the first import of its modules."""
+    if os.environ.get("CMEEL_EDITABLE_REBUILD", "1").upper() in ("0", "NO", "OFF"):
+        return
+    sys.meta_path.insert(0, Finder(name, source, build, sitelib))
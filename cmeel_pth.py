@@ -1,8 +1,14 @@
-"""Append cmeel prefix sitelib to sys.path."""
+"""Append cmeel prefix sitelib to sys.path, and restore or preload its libraries.
+
+Deduplicated files are restored as symlinks, and shared libraries built for the CPU
+level are preloaded if the dynamic loader can't choose them.
+
+This runs at every interpreter startup, so it only relies on os.path: importing
+pathlib would cost more than the rest of this module.
+"""
 
 import os
 import sys
-from pathlib import Path
 
 # This is copy-pasted to avoid any non-stdlib import in the .pth file
 # vvv uwarning: keep sync with cmeel/consts.py
@@ -10,11 +16,146 @@ CMEEL_PREFIX = "cmeel.prefix"
 SITELIB = os.sep.join(  # noqa: PTH118
     ["lib", "python" + ".".join(sys.version.split(".")[:2]), "site-packages"],
 )
+LINKS = os.path.join("share", "cmeel", "links")  # noqa: PTH118
+RESTORED = LINKS + ".restored"
+# ^^^
+# vvv Warning: keep sync with cmeel/isa.py
+LEVELS = {
+    "x86-64-v2": ["cx16", "lahf_lm", "popcnt", "sse4_1", "sse4_2", "ssse3"],
+    "x86-64-v3": ["abm", "avx", "avx2", "bmi1", "bmi2", "f16c", "fma", "movbe"],
+    "x86-64-v4": ["avx512bw", "avx512cd", "avx512dq", "avx512f", "avx512vl"],
+}
+PRELOAD = "cmeel-preload.txt"
 # ^^^
 
-sys.path.append(str(Path(__file__).parent / CMEEL_PREFIX / SITELIB))
+_here = os.path.dirname(__file__)  # noqa: PTH120
+sys.path.append(os.path.join(_here, CMEEL_PREFIX, SITELIB))  # noqa: PTH118
 
+_known = set(sys.path)
 for path in sys.path.copy():
-    cmeel_sitelib = Path(path) / CMEEL_PREFIX / SITELIB
-    if cmeel_sitelib.exists() and str(cmeel_sitelib) not in sys.path:
-        sys.path.append(str(cmeel_sitelib))
+    cmeel_sitelib = os.path.join(path, CMEEL_PREFIX, SITELIB)  # noqa: PTH118
+    if cmeel_sitelib not in _known and os.path.isdir(cmeel_sitelib):  # noqa: PTH112
+        sys.path.append(cmeel_sitelib)
+        _known.add(cmeel_sitelib)
+
+
+def mtime(path):
+    """Get the mtime of path, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns  # noqa: PTH116
+    except OSError:
+        return None
+
+
+def read_manifests(links_dir):
+    """Read the symlinks to create, and their targets, from the manifests."""
+    wanted = {}
+    for name in sorted(os.listdir(links_dir)):  # noqa: PTH208
+        with open(os.path.join(links_dir, name)) as f:  # noqa: PTH118, PTH123
+            for line in f.read().splitlines():
+                link, target = line.split("\t")
+                wanted[link] = target
+    return wanted
+
+
+def update_links(prefix, wanted, previous):
+    """Remove symlinks previously created and no longer wanted, and create others."""
+    for link in previous:
+        path = os.path.join(prefix, link)  # noqa: PTH118
+        if link not in wanted and os.path.islink(path):  # noqa: PTH114
+            os.unlink(path)  # noqa: PTH108
+    for link, target in wanted.items():
+        path = os.path.join(prefix, link)  # noqa: PTH118
+        if os.path.islink(path) and os.readlink(path) != target:  # noqa: PTH114
+            os.unlink(path)  # noqa: PTH108
+        if not os.path.lexists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)  # noqa: PTH103, PTH120
+            os.symlink(target, path)  # noqa: PTH211
+
+
+def restore_links(prefix):
+    """Create symlinks of libraries deduplicated in wheels, see cmeel/dedupe.py.
+
+    This only costs two stats if they were restored after the last change of the
+    manifests, or if there is none.
+    """
+    links_dir = os.path.join(prefix, LINKS)  # noqa: PTH118
+    restored = os.path.join(prefix, RESTORED)  # noqa: PTH118
+    changed, done = mtime(links_dir), mtime(restored)
+    if changed is None and done is None:
+        # no manifest, and no symlink to remove
+        return
+    if changed is not None and done is not None and done > changed:
+        return
+    # vvv Warning: keep sync with cmeel/dedupe.py
+    wanted = {} if changed is None else read_manifests(links_dir)
+    previous = []
+    if done is not None:
+        with open(restored) as f:  # noqa: PTH123
+            previous = f.read().splitlines()
+    update_links(prefix, wanted, previous)
+    if wanted:
+        with open(restored, "w") as f:  # noqa: PTH123
+            f.writelines(f"{link}\n" for link in sorted(wanted))
+    elif previous:
+        os.unlink(restored)  # noqa: PTH108
+    # ^^^
+
+
+try:
+    restore_links(os.path.join(_here, CMEEL_PREFIX))  # noqa: PTH118
+except OSError:
+    # eg. read-only site-packages, or another interpreter doing the same
+    pass
+
+
+def best_level():
+    """Get the best CPU level supported by this CPU, from /proc/cpuinfo."""
+    with open("/proc/cpuinfo") as f:  # noqa: PTH123
+        flags = next(
+            (set(line.split()) for line in f if line.startswith("flags")), set()
+        )
+    level = "x86-64"
+    for candidate, required in LEVELS.items():
+        if not flags.issuperset(required):
+            break
+        level = candidate
+    return level
+
+
+def preload_isa_variants(prefix):
+    """Load libraries of the selected CPU level first, see cmeel/isa.py.
+
+    This is only needed with glibc < 2.33, or to override its choice with CMEEL_ISA,
+    and only done if the prefix has such libraries.
+    """
+    hwcaps = os.path.join(prefix, "lib", "glibc-hwcaps")  # noqa: PTH118
+    if not os.path.isdir(hwcaps):  # noqa: PTH112
+        return
+    level = os.environ.get("CMEEL_ISA")
+    if not level:
+        libc = (os.confstr("CS_GNU_LIBC_VERSION") or "").split()
+        if libc[:1] == ["glibc"] and tuple(map(int, libc[1].split(".")[:2])) >= (2, 33):
+            return
+        level = best_level()
+    directory = os.path.join(hwcaps, level)  # noqa: PTH118
+    if not os.path.isdir(directory):  # noqa: PTH112
+        # eg. CMEEL_ISA=x86-64: the baseline libraries are found as usual
+        return
+    import ctypes
+
+    # a variant needed by another one must be loaded first, or the loader would
+    # find the baseline library of the same SONAME through RUNPATH
+    with open(os.path.join(hwcaps, PRELOAD)) as f:  # noqa: PTH118, PTH123
+        sonames = f.read().split()
+    for soname in sonames:
+        path = os.path.join(directory, soname)  # noqa: PTH118
+        if os.path.exists(path):  # noqa: PTH110
+            ctypes.CDLL(path, mode=ctypes.RTLD_GLOBAL)
+
+
+try:
+    preload_isa_variants(os.path.join(_here, CMEEL_PREFIX))  # noqa: PTH118
+except (OSError, ValueError):
+    # eg. no /proc/cpuinfo or a library which can't be loaded: keep the loader choice
+    pass
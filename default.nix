@@ -2,11 +2,9 @@
   lib,
   buildPythonApplication,
   cmake,
-  git-archive-all,
   hatchling,
   packaging,
   tomli,
-  wheel,
 }:
 
 buildPythonApplication rec {
@@ -36,9 +34,7 @@ buildPythonApplication rec {
   optional-dependencies = {
     build = [
       cmake
-      git-archive-all
       packaging
-      wheel
     ];
   };
 